@@ -0,0 +1,117 @@
+"""Batch files for Singer BATCH messages."""
+
+import gzip
+import json
+import os
+import uuid
+from typing import Any, Dict, List, Optional
+
+from singer import BatchMessage
+
+from tap_planfix.writer import dumps
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+BATCH_FORMATS = ("jsonl", "parquet")
+
+
+def _encode_record(record: dict) -> bytes:
+    try:
+        return dumps(record)
+    except TypeError:
+        return json.dumps(record, default=str).encode()
+
+
+class _BatchFile:
+    """One open batch file of a stream."""
+
+    def __init__(self, path: str, file_format: str) -> None:
+        self.path = path
+        self.file_format = file_format
+        self.record_count = 0
+        self._records: List[dict] = []
+        self._file: Optional[Any] = None
+        if file_format == "jsonl":
+            self._file = gzip.open(path, "wb", compresslevel=6)
+
+    def write(self, record: dict) -> None:
+        if self._file:
+            self._file.write(_encode_record(record) + b"\n")
+        else:
+            self._records.append(record)
+        self.record_count += 1
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+            return
+        table = pyarrow.Table.from_pylist(self._records)
+        pyarrow.parquet.write_table(table, self.path)
+        self._records = []
+
+
+class BatchFileWriter:
+    """Write the records of a stream to rotating batch files in `directory`.
+
+    Records go to gzip-compressed JSON lines files, or to Parquet files, which
+    need `pyarrow`. A file is full after `max_records` records. `close` closes
+    the open files and returns a BATCH message for each of them.
+    """
+
+    def __init__(self, directory: str, file_format: str, max_records: int) -> None:
+        if file_format not in BATCH_FORMATS:
+            raise ValueError(
+                f"Unknown batch format '{file_format}', expected one of "
+                f"{', '.join(BATCH_FORMATS)}."
+            )
+        if file_format == "parquet" and pyarrow is None:
+            raise ValueError("Batch format 'parquet' requires pyarrow to be installed.")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = os.path.abspath(directory)
+        self.file_format = file_format
+        self.max_records = max_records
+        self._run_id = uuid.uuid4().hex[:8]
+        self._file_count = 0
+        self._files: Dict[str, _BatchFile] = {}
+
+    @property
+    def pending(self) -> bool:
+        """Return True if records were written since the last `close`."""
+        return bool(self._files)
+
+    def write(self, stream_name: str, record: dict) -> bool:
+        """Write a record of `stream_name`, returning True once its file is full."""
+        batch_file = self._files.get(stream_name)
+        if batch_file is None:
+            self._file_count += 1
+            extension = "jsonl.gz" if self.file_format == "jsonl" else "parquet"
+            file_name = (
+                f"{stream_name}-{self._run_id}-{self._file_count:05d}.{extension}"
+            )
+            batch_file = _BatchFile(
+                os.path.join(self.directory, file_name), self.file_format
+            )
+            self._files[stream_name] = batch_file
+        batch_file.write(record)
+        return batch_file.record_count >= self.max_records
+
+    def close(self) -> List[BatchMessage]:
+        """Close all open files and return their BATCH messages."""
+        messages = []
+        for stream_name, batch_file in self._files.items():
+            batch_file.close()
+            messages.append(
+                BatchMessage(
+                    stream=stream_name,
+                    filepath=batch_file.path,
+                    file_format=self.file_format,
+                    compression="gzip" if self.file_format == "jsonl" else None,
+                    batch_size=batch_file.record_count,
+                )
+            )
+        self._files = {}
+        return messages
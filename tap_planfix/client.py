@@ -1,20 +1,58 @@
 """REST client handling, including PlanfixStream base class."""
 
 import requests
-from typing import Any, Dict, Optional, Union, List, Iterable, cast
+import cProfile
+import copy
+import json
+import os
+import time
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Optional,
+    List,
+    Iterable,
+    Generator,
+    Tuple,
+)
 import pendulum
-from datetime import date, datetime
-from singer.schema import Schema
+from datetime import datetime, timedelta
 import logging
 
-from singer_sdk.helpers.jsonpath import extract_jsonpath
+import backoff
 from singer_sdk.plugin_base import PluginBase as TapBaseClass
 from singer_sdk.streams import RESTStream
 from singer_sdk.authenticators import BearerTokenAuthenticator
+from singer_sdk.exceptions import FatalAPIError, RetriableAPIError
+
+from tap_planfix.batch import BatchFileWriter
+from tap_planfix.datetimes import parse_datetime, parse_iso_datetime
+from tap_planfix.fieldcache import FieldCache, metadata_hash, resolve_field_columns
+from tap_planfix.fingerprints import FingerprintStore, record_fingerprint
+from tap_planfix.metrics import StreamMetrics
+from tap_planfix.pagination import (
+    PagePipeline,
+    PageSizeController,
+    PartitionPrefetcher,
+)
+from tap_planfix.ratelimit import RequestScheduler
+from tap_planfix.parsing import iter_json_array
+from tap_planfix.transform import CustomFieldTransformer
+from tap_planfix.writer import MessageWriter
 
 
 DEFAULT_REQUEST_TIMEOUT = 300  # 5 minutes
 
+# Pairs of a page token and the records of that page.
+Pages = Generator[Tuple[dict, Iterable[dict]], None, None]
+
 
 def extract_tag_name(string):
     start_index = string.index(".") + 1
@@ -27,11 +65,22 @@ class PlanfixStream(RESTStream):
     """Planfix stream class."""
 
     rest_method = "POST"
+    # Requests are reported as aggregated metrics instead of one log per request.
+    _LOG_REQUEST_METRICS = False
     PAGE_SIZE = 100
+    MIN_PAGE_SIZE = 10
+    MAX_PAGE_SIZE = 100
     fields = ""
-    fields_name_map = {}
+    fields_name_map: Dict[str, str] = {}
+    # Columns of custom fields by id, taking precedence over `fields_name_map`.
+    field_ids: Dict[int, str] = {}
     filter_field_type_id = 0
     filter_field_id = 0
+    # Endpoint listing the custom fields of the stream, for `field_cache_path`.
+    field_metadata_path = ""
+    # Planfix "otherDate" filters compare whole days. Streams whose filter type
+    # accepts a time of day may override this with a format including it.
+    filter_date_format = "%d-%m-%Y"
 
     def __init__(
         self,
@@ -40,8 +89,37 @@ class PlanfixStream(RESTStream):
         schema = None,
         path = None,
     ) -> None:
-        self.processed_fields = {}
         super().__init__(tap, name, schema, path)
+        if self.change_detection and self.config.get("emit_tombstones"):
+            properties = dict(self.schema["properties"])
+            properties["_sdc_deleted_at"] = {
+                "type": ["string", "null"],
+                "format": "date-time",
+            }
+            # Streams declare `schema` as a class attribute over the SDK property.
+            self.schema = {**self.schema, "properties": properties}  # type: ignore
+        self._field_transformer: Optional[CustomFieldTransformer] = None
+        self._field_transformer_lock = threading.Lock()
+        self._authenticator: Optional[BearerTokenAuthenticator] = None
+        self._partitions: Optional[List[dict]] = None
+        self._prefetcher: Optional[PartitionPrefetcher] = None
+        self.batch_files: Optional[BatchFileWriter] = None
+        self._pending_state: Optional[dict] = None
+        if self.config.get("batch_dir"):
+            self.batch_files = BatchFileWriter(
+                self.config["batch_dir"],
+                self.config.get("batch_format") or "jsonl",
+                self.config.get("batch_max_records") or 100000,
+            )
+        self.page_sizer: Optional[PageSizeController] = None
+        if self.config.get("adaptive_page_size"):
+            self.page_sizer = PageSizeController(
+                initial=self.PAGE_SIZE,
+                minimum=self.MIN_PAGE_SIZE,
+                maximum=self.config.get("max_page_size") or self.MAX_PAGE_SIZE,
+                target_latency=self.config.get("target_page_latency") or 5,
+                target_bytes=self.config.get("target_page_bytes") or 1 << 21,
+            )
 
     @property
     def url_base(self) -> str:
@@ -49,25 +127,36 @@ class PlanfixStream(RESTStream):
 
     @property
     def authenticator(self) -> BearerTokenAuthenticator:
-        """Return a new authenticator object."""
-        return BearerTokenAuthenticator.create_for_stream(
-            self, token=self.config.get("planfix_token")  # type: ignore
-        )
+        """Return the authenticator object, created once per stream."""
+        if self._authenticator is None:
+            self._authenticator = BearerTokenAuthenticator.create_for_stream(
+                self, token=self.config.get("planfix_token")  # type: ignore
+            )
+        return self._authenticator
+
+    @property
+    def requests_session(self) -> requests.Session:
+        """Return the pooled session shared by all streams of the tap."""
+        return self._tap.transport.session  # type: ignore
 
     def prepare_request_payload(
-        self, context: Optional[dict], next_page_token: Optional[Any]
+        self, context: Optional[dict], next_page_token: Any
     ) -> Optional[dict]:
-        starting_timestamp = (
-            self.get_starting_timestamp(context) or self.config["start_date"]
-        )
-
         payload = {
-            "offset": next_page_token,
-            "pageSize": self.PAGE_SIZE,
-            "fields": self.fields,
+            "offset": next_page_token["offset"],
+            "pageSize": next_page_token["page_size"],
+            "fields": self.requested_fields,
         }
 
         if self.replication_key:
+            starting_timestamp = parse_iso_datetime(next_page_token["window_start"])
+            filter_start = starting_timestamp
+            windowed = "window_end" in next_page_token
+            if (
+                self.precise_incremental or windowed
+            ) and "%H" not in self.filter_date_format:
+                # "gt" on a whole day would skip the rest of the starting day.
+                filter_start = starting_timestamp - timedelta(days=1)
             filters = {
                 "filters": [
                     {
@@ -75,60 +164,775 @@ class PlanfixStream(RESTStream):
                         "operator": "gt",
                         "value": {
                             "dateType": "otherDate",
-                            "dateValue": f"{starting_timestamp.strftime('%d-%m-%Y')}",
+                            "dateValue": filter_start.strftime(self.filter_date_format),
                         },
                         "field": self.filter_field_id,
                     }
                 ]
             }
+            if next_page_token.get("window_end"):
+                window_end = parse_iso_datetime(next_page_token["window_end"])
+                filters["filters"].append(
+                    {
+                        "type": self.filter_field_type_id,
+                        "operator": "lt",
+                        "value": {
+                            "dateType": "otherDate",
+                            "dateValue": window_end.strftime(self.filter_date_format),
+                        },
+                        "field": self.filter_field_id,
+                    }
+                )
             payload.update(filters)
-        
-        logger = logging.getLogger(__name__)
-        logger.info(msg=f"Request payload:\n{payload}")
+            if self.precise_incremental:
+                payload["sorting"] = [
+                    {"field": self.filter_field_id, "sortDirection": "Desc"}
+                ]
+
+        if self.keyset_filter_type_id is not None:
+            after_key = next_page_token.get("after_key")
+            if after_key is not None:
+                payload.setdefault("filters", []).append(
+                    {
+                        "type": self.keyset_filter_type_id,
+                        "operator": "gt",
+                        "value": after_key,
+                    }
+                )
+            payload["sorting"] = [{"field": self.keyset_key, "sortDirection": "Asc"}]
+
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"Request payload:\n{payload}")
 
         return payload
 
+    @property
+    def selected_columns(self) -> List[str]:
+        """Return the schema properties selected in the catalog."""
+        return [
+            name
+            for name in self.schema["properties"]
+            if self.mask[("properties", name)]
+        ]
+
+    @property
+    def field_transformer(self) -> CustomFieldTransformer:
+        """Return the custom field transformer for the selected columns."""
+        with self._field_transformer_lock:
+            if self._field_transformer is None:
+                self._field_transformer = CustomFieldTransformer(
+                    self.fields_name_map,
+                    self.schema,
+                    self.selected_columns,
+                    field_ids={
+                        **(self.discovered_field_columns() or {}),
+                        **self.field_ids,
+                    },
+                )
+        return self._field_transformer
+
+    @property
+    def field_cache(self) -> FieldCache:
+        """Return the custom field cache shared by all streams of the tap."""
+        return self._tap.field_cache  # type: ignore
+
+    def discovered_field_columns(self) -> Optional[Dict[int, str]]:
+        """Return the columns of the custom fields of `fields` by id, if cached.
+
+        With `field_cache_path` set, Planfix field metadata is read at most once
+        per `field_cache_ttl`, and the columns resolved from it are kept in that
+        file. Columns are only resolved again when the metadata hash changed, and
+        a renamed field keeps its column. Without metadata, fields are mapped by
+        the name each row gives them.
+        """
+        if not (self.config.get("field_cache_path") and self.field_metadata_path):
+            return None
+        cache = self.field_cache
+        entry = cache.get(self.name)
+        if entry and cache.is_fresh(entry):
+            return cache.columns(entry)
+        known = cache.columns(entry) if entry else None
+        try:
+            metadata = self.request_field_metadata()
+        except (FatalAPIError, RetriableAPIError, requests.RequestException) as e:
+            self.logger.warning(
+                f"Could not read the custom fields of '{self.name}': {e}"
+            )
+            return known
+        field_ids = {int(f) for f in self.fields.split(",") if f.isdigit()}
+        fields = [field for field in metadata if field.get("id") in field_ids]
+        digest = metadata_hash(fields)
+        if entry and entry["hash"] == digest:
+            columns = known or {}
+        else:
+            columns, renamed = resolve_field_columns(
+                fields, self.fields_name_map, self.schema["properties"], known
+            )
+            for field in fields:
+                if field.get("id") in renamed:
+                    self.logger.warning(
+                        f"Custom field {field['id']} of '{self.name}' was renamed "
+                        f"to '{field.get('name')}', keeping column "
+                        f"'{columns[field['id']]}'."
+                    )
+        cache.put(self.name, digest, columns)
+        return columns
+
+    def request_field_metadata(self) -> List[dict]:
+        """Return the custom fields of the stream as Planfix lists them."""
+        headers = {**self.http_headers, **(self.authenticator.auth_headers or {})}
+        prepared_request = self.requests_session.prepare_request(
+            requests.Request(
+                "GET", self.url_base + self.field_metadata_path, headers=headers
+            )
+        )
+        response = self.request_decorator(self._request)(prepared_request, None)
+        return response.json().get("customfields") or []
+
+    @property
+    def requested_fields(self) -> str:
+        """Return the ids from `fields` that selected columns depend on.
+
+        Planfix only reports the name of a custom field in responses, so custom
+        field ids are requested until a response maps them to a column.
+        """
+        selected = set(self.selected_columns)
+        field_columns = self.field_transformer.field_columns
+        requested = []
+        for field in self.fields.split(","):
+            if not field.isdigit():
+                needed = field in selected or field not in self.schema["properties"]
+            elif int(field) == self.filter_field_id or int(field) not in field_columns:
+                needed = True
+            else:
+                needed = field_columns[int(field)] is not None
+            if needed:
+                requested.append(field)
+        return ",".join(requested)
+
+    def _starting_timestamp(self, context: Optional[dict]) -> datetime:
+        return self.get_starting_timestamp(context) or parse_iso_datetime(
+            self.config["start_date"]
+        )
+
+    @property
+    def partitions(self) -> Optional[List[dict]]:
+        """Return date windows from `start_date` to now, if windows are configured.
+
+        With `partition_window_days` set, streams filtered by date are synced as
+        consecutive windows of that many days, each with its own bookmark. The
+        last window is left open, so that it also covers records created while
+        the sync runs. Closed windows synced to the end are complete and left
+        out, as no record can move into them any more.
+        """
+        window_days = self.config.get("partition_window_days")
+        if not (window_days and self.replication_key and self.filter_field_id):
+            return super().partitions
+        if self._partitions is None:
+            window_start = parse_iso_datetime(self.config["start_date"]).start_of("day")
+            now = pendulum.now("UTC")
+            windows = []
+            while window_start <= now:
+                window_end = window_start.add(days=window_days)
+                windows.append(
+                    {
+                        "window_start": window_start.isoformat(),
+                        "window_end": window_end.isoformat()
+                        if window_end <= now
+                        else None,
+                    }
+                )
+                window_start = window_end
+            self._close_open_window_state(windows)
+            complete = [
+                entry["context"]
+                for entry in self.stream_state.get("partitions", [])
+                if entry.get("window_complete")
+            ]
+            self._partitions = [w for w in windows if w not in complete]
+        return self._partitions
+
+    def _close_open_window_state(self, windows: List[dict]) -> None:
+        """Move the state of a window that closed since the last sync to its context.
+
+        The open window of the last sync keeps its bookmark once it is closed.
+        Its checkpoint is dropped, as it was taken without the end bound.
+        """
+        closed = {w["window_start"]: w for w in windows if w["window_end"]}
+        for entry in self.stream_state.get("partitions", []):
+            context = entry.get("context") or {}
+            if "window_end" in context and context["window_end"] is None:
+                window = closed.get(context.get("window_start"))
+                if window:
+                    entry["context"] = dict(window)
+                    entry.pop("checkpoint", None)
+
+    @property
+    def records_key(self) -> str:
+        """Return the top-level response key holding the page records."""
+        return extract_tag_name(self.records_jsonpath)
+
+    @property
+    def page_size(self) -> int:
+        """Return the page size for the next request."""
+        if self.page_sizer:
+            return self.page_sizer.size
+        return self.PAGE_SIZE
+
+    @property
+    def keyset_filter_type_id(self) -> Optional[int]:
+        """Return the Planfix filter type on the primary key, if keyset paging is on.
+
+        Keyset pagination requests the next page as the records with a key
+        greater than the last one seen, sorted by key, so that every page costs
+        the same and rows inserted mid-scan do not shift pages.
+        """
+        return (self.config.get("keyset_filter_types") or {}).get(self.name)
+
+    @property
+    def keyset_key(self) -> str:
+        """Return the record key that keyset pagination advances on."""
+        return self.primary_keys[0]  # type: ignore
+
+    def _page_token(self, previous_token: dict, offset: int) -> dict:
+        return {**previous_token, "offset": offset, "page_size": self.page_size}
+
     def get_next_page_token(
-        self, response: requests.Response, previous_token: Optional[Any]
+        self, response: requests.Response, previous_token: Any
     ) -> Optional[Any]:
         """Return a token for identifying next page or None if no more pages."""
-        results = response.json()
+        record_count = getattr(response, "record_count", None)
+        if record_count is None:
+            record_count = sum(1 for _ in self.parse_response(response))
 
-        if not results or not results[extract_tag_name(self.records_jsonpath)]:
+        if not record_count:
             return None
 
-        next_page_token = (
-            previous_token + self.PAGE_SIZE if previous_token else self.PAGE_SIZE
+        if self.keyset_filter_type_id is not None:
+            return {
+                **previous_token,
+                "after_key": response.last_key,  # type: ignore
+                "page_size": self.page_size,
+            }
+
+        next_offset = previous_token["offset"] + previous_token["page_size"]
+        return self._page_token(previous_token, next_offset)
+
+    @property
+    def request_scheduler(self) -> Optional[RequestScheduler]:
+        """Return the rate limiter shared by all streams, if one is configured."""
+        return self._tap.request_scheduler  # type: ignore
+
+    @property
+    def request_slots(self) -> Optional[threading.BoundedSemaphore]:
+        """Return the request budget shared by all streams, if one is configured."""
+        return self._tap.request_slots  # type: ignore
+
+    def _request(
+        self, prepared_request: requests.PreparedRequest, context: Optional[dict]
+    ) -> requests.Response:
+        if self.request_scheduler:
+            # Incremental syncs go before backfills.
+            has_bookmark = "replication_key_value" in self.get_context_state(context)
+            self.request_scheduler.acquire(priority=has_bookmark)
+        # Only requests on the wire count against `max_requests_in_flight`.
+        with self.request_slots or nullcontext():
+            return super()._request(prepared_request, context)
+
+    @property
+    def metrics(self) -> StreamMetrics:
+        """Return the performance metrics of this stream."""
+        return self._tap.metrics.for_stream(self.name)  # type: ignore
+
+    def _write_metrics(self) -> None:
+        """Log the stream metrics as Singer METRIC lines and update the textfile."""
+        log = self._metric_logging_function
+        if log:
+            for point in self.metrics.points():
+                log(f"INFO METRIC: {json.dumps(point)}")
+        if self.config.get("metrics_textfile"):
+            self._tap.metrics.write_textfile(  # type: ignore
+                self.config["metrics_textfile"]
+            )
+
+    def request_decorator(self, func: Callable) -> Callable:
+        """Retry like the SDK does, adding the time waited to the stream metrics."""
+
+        def on_backoff(details: dict) -> None:
+            self.metrics.add_time("retry_wait", details["wait"])
+
+        return backoff.on_exception(
+            backoff.expo,
+            (RetriableAPIError, requests.exceptions.ReadTimeout),
+            max_tries=5,
+            factor=2,
+            on_backoff=on_backoff,
+        )(func)
+
+    def validate_response(self, response: requests.Response) -> None:
+        """Validate the response, retrying `429 Too Many Requests` after a pause."""
+        self.metrics.observe_request(
+            response.elapsed.total_seconds(), len(response.content)
         )
-        return next_page_token
+        if self.request_scheduler:
+            self.request_scheduler.observe(response.status_code, response.headers)
+        if response.status_code == 429:
+            raise RetriableAPIError(
+                f"429 Client Error: {response.reason} for path: {self.path}"
+            )
+        super().validate_response(response)
+
+    def request_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Request records page by page.
+
+        With `page_concurrency` set, pages are prefetched concurrently, and with
+        `partition_concurrency` set, so are the pages of upcoming partitions. With
+        `pipelined_sync` set, pages are fetched and post-processed on threads of
+        their own while earlier records are emitted, and the records come out
+        post-processed. With `page_checkpoints` set, the position after every
+        emitted record is kept in the stream state, so that an interrupted sync
+        resumes right after the last record it emitted, with the same filter
+        window.
+        """
+        state = self.get_context_state(context)
+        if self.config.get("page_checkpoints") and state.get("checkpoint"):
+            self.logger.info(
+                f"Resuming '{self.name}' from checkpoint {state['checkpoint']}."
+            )
+        first_token, skip = self._first_page_token(context)
+        pages = self._record_pages(context, first_token)
+
+        metrics = self.metrics
+        metrics_interval = self.config.get("metrics_interval") or 60
+        try:
+            for page_token, records in pages:
+                page_records = yield from self._page_records(
+                    page_token, records, skip, state
+                )
+                skip = 0
+                metrics.observe_page(page_records)
+                if metrics.due(metrics_interval):
+                    self._write_metrics()
+        except GeneratorExit:
+            # Paging was stopped on purpose, there is nothing left to resume.
+            state.pop("checkpoint", None)
+            pages.close()
+            raise
+        state.pop("checkpoint", None)
+
+        if self.page_sizer:
+            self.logger.info(
+                f"Stream '{self.name}' settled on pageSize {self.page_sizer.size}."
+            )
+
+    def _record_pages(
+        self, context: Optional[dict], first_token: dict
+    ) -> Generator[Tuple[dict, Iterable[Optional[dict]]], None, None]:
+        """Yield the pages of a context, prefetched or pipelined as configured.
+
+        Pipelined records are post-processed already, and None where dropped.
+        """
+        pages: Optional[Pages] = None
+        if context and context in (self.partitions or []):
+            pages = self._prefetched_pages(context)
+        if pages is None:
+            pages = self._fetch_pages(context, first_token)
+        if self.pipelined:
+            yield from PagePipeline(
+                pages,
+                partial(self.post_process, context=context),
+                buffer=self.config.get("pipeline_buffer_pages") or 4,
+            )
+        else:
+            yield from pages
+
+    def _page_records(
+        self, page_token: dict, records: Iterable[Any], skip: int, state: dict
+    ) -> Generator[Any, None, int]:
+        """Yield the records of a page after the first `skip` of them.
+
+        With `page_checkpoints` set, the position after every yielded record and
+        after the whole page is kept in `state`. Returns the number of records
+        on the page.
+        """
+        checkpoints = bool(self.config.get("page_checkpoints"))
+        keyset = self.keyset_filter_type_id is not None
+        position = {k: v for k, v in page_token.items() if k != "page_size"}
+        if not keyset:
+            position["skip"] = 0
+        page_records = 0
+        for record in records:
+            page_records += 1
+            if not keyset:
+                position["skip"] += 1
+            elif record is not None:
+                position["after_key"] = record.get(self.keyset_key)
+            if page_records <= skip:
+                continue
+            yield record
+            if checkpoints:
+                state["checkpoint"] = dict(position)
+        if checkpoints:
+            if not keyset:
+                position["offset"] += page_token["page_size"]
+                position["skip"] = 0
+            state["checkpoint"] = position
+            self._write_state_message()
+        return page_records
+
+    def _first_page_token(self, context: Optional[dict]) -> Tuple[dict, int]:
+        """Return the first page token of a context and the records to skip on it.
+
+        The token resumes from the checkpoint of the context, if any.
+        """
+        state = self.get_context_state(context)
+        checkpoint = state.get("checkpoint")
+        if checkpoint and self.config.get("page_checkpoints"):
+            first_token = dict(checkpoint)
+            skip = first_token.pop("skip", 0)
+        else:
+            window_start: Optional[str] = None
+            if self.replication_key:
+                start = self._starting_timestamp(context)
+                if context and context.get("window_start"):
+                    start = max(start, parse_iso_datetime(context["window_start"]))
+                window_start = start.isoformat()
+            first_token = {"offset": 0, "window_start": window_start}
+            if context and "window_end" in context:
+                first_token["window_end"] = context["window_end"]
+            skip = 0
+        first_token["page_size"] = self.page_size
+        return first_token, skip
+
+    def _fetch_pages(self, context: Optional[dict], first_token: dict) -> Pages:
+        concurrency = self.config.get("page_concurrency") or 1
+        if concurrency > 1 and self.keyset_filter_type_id is None:
+            return self._request_pages_concurrently(context, first_token, concurrency)
+        return self._request_pages(context, first_token)
+
+    def _prefetched_pages(self, context: dict) -> Optional[Pages]:
+        """Return the pages of a partition fetched ahead of its turn, if enabled.
+
+        On the first partition, every partition of the stream is submitted to a
+        pool of `partition_concurrency` workers, with the first token its own
+        state gives. Checkpoints and bookmarks are still only updated as the
+        records of each partition are emitted, in order.
+        """
+        concurrency = self.config.get("partition_concurrency") or 1
+        if concurrency <= 1:
+            return None
+        if self._prefetcher is None:
+            self._prefetcher = PartitionPrefetcher(concurrency)
+            for partition in self.partitions or []:
+                self._write_starting_replication_value(partition)
+                first_token, _ = self._first_page_token(partition)
+                self._prefetcher.submit(
+                    json.dumps(partition, sort_keys=True),
+                    partial(self._fetch_materialized_pages, partition, first_token),
+                )
+        return self._prefetcher.take(json.dumps(context, sort_keys=True))
+
+    def _fetch_materialized_pages(
+        self, context: dict, first_token: dict
+    ) -> Iterable[Tuple[dict, List[dict]]]:
+        for page_token, records in self._fetch_pages(context, first_token):
+            yield page_token, list(records)
+
+    def _sync_records(self, context: Optional[dict] = None) -> None:
+        """Sync records, reporting metrics at the end.
+
+        Record fingerprints of change detection are committed only after a
+        successful sync, once buffered messages and batch files are written out.
+        With `profile_dir` set, the sync runs under `cProfile`, and the profile
+        is saved as `<stream name>.prof` in that directory. Only the thread
+        syncing the stream is profiled, not the workers fetching pages for it.
+        """
+        profiler = None
+        if self.config.get("profile_dir"):
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            super()._sync_records(context)
+        finally:
+            if profiler:
+                profiler.disable()
+                os.makedirs(self.config["profile_dir"], exist_ok=True)
+                profiler.dump_stats(
+                    os.path.join(self.config["profile_dir"], f"{self.name}.prof")
+                )
+            if self._prefetcher:
+                self._prefetcher.close()
+                self._prefetcher = None
+            self._write_batch_messages()
+            self.writer.flush()
+            self._write_metrics()
+        if self.change_detection:
+            self.fingerprints.commit(self.name)
+
+    def _request_page(
+        self, context: Optional[dict], page_token: dict
+    ) -> Tuple[dict, requests.Response]:
+        """Request a page, retrying failures with the adaptive page size.
+
+        Only list pages adjust the adaptive page size. A failed or timed out
+        page shrinks it, and every retry is prepared again, no larger than that
+        size. Returns the token of the request that succeeded along with its
+        response.
+        """
+
+        def send(token: dict) -> Tuple[dict, requests.Response]:
+            if self.page_sizer:
+                size = min(token["page_size"], self.page_sizer.size)
+                token = {**token, "page_size": size}
+            prepared_request = self.prepare_request(context, next_page_token=token)
+            try:
+                response = self._request(prepared_request, context)
+            except (RetriableAPIError, requests.exceptions.ReadTimeout):
+                if self.page_sizer:
+                    self.page_sizer.record_failure()
+                raise
+            if self.page_sizer:
+                self.page_sizer.record_page(
+                    response.elapsed.total_seconds(), len(response.content)
+                )
+            return token, response
+
+        return self.request_decorator(send)(page_token)
+
+    def _request_pages(self, context: Optional[dict], first_token: dict) -> Pages:
+        """Request pages one after another until an empty page comes back."""
+        next_page_token: Optional[dict] = first_token
+        while next_page_token:
+            page_token, response = self._request_page(context, next_page_token)
+            yield page_token, self.parse_response(response)
+            next_page_token = self.get_next_page_token(response, page_token)
+
+    def _request_pages_concurrently(
+        self, context: Optional[dict], first_token: dict, concurrency: int
+    ) -> Pages:
+        """Keep `concurrency` offset pages in flight and yield them in order.
+
+        Offsets are known in advance, so pages are requested ahead of time on a
+        bounded pool. Paging stops at the first empty page and every request
+        still outstanding at that point is cancelled.
+        """
+
+        def fetch_page(page_token: dict) -> Tuple[dict, List[dict]]:
+            # Later offsets are taken already, so when a retry shrinks the page,
+            # the rest of its range is requested separately.
+            records: List[dict] = []
+            end = page_token["offset"] + page_token["page_size"]
+            token = page_token
+            while True:
+                token, response = self._request_page(context, token)
+                page = list(self.parse_response(response))
+                records += page
+                offset = token["offset"] + token["page_size"]
+                if not page or offset >= end:
+                    return page_token, records
+                token = {**token, "offset": offset, "page_size": end - offset}
+
+        next_offset = first_token["offset"]
+
+        def submit_next() -> None:
+            nonlocal next_offset
+            page_token = self._page_token(first_token, next_offset)
+            pending.append(executor.submit(fetch_page, page_token))
+            next_offset += page_token["page_size"]
+
+        pending: deque = deque()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for _ in range(concurrency):
+                submit_next()
+            try:
+                while pending:
+                    page_token, records = pending.popleft().result()
+                    if not records:
+                        break
+                    yield page_token, records
+                    submit_next()
+            finally:
+                for future in pending:
+                    future.cancel()
 
     def parse_response(self, response: requests.Response) -> Iterable[dict]:
-        yield from extract_jsonpath(self.records_jsonpath, input=response.json())
+        """Decode the page once, yielding records as they are parsed.
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> Optional[dict]:
-        if not row.get("customFieldData"):
-            return row
-        custom_fields = row.pop("customFieldData")
-        for field in custom_fields:
-            if (
-                isinstance(field.get("value", {}), dict)
-                and field.get("value", {}).get("datetime") != None
-            ):
-                self.processed_fields[field.get("field", {}).get("name", "datetime")] = field.get("value", {}).get("datetime")
-            elif (
-                isinstance(field.get("value", {}), dict)
-                and field.get("value", {}).get("value") != None
-            ):
-                self.processed_fields[field.get("field", {}).get("name", "value")] = field.get("value", {}).get("value")
+        The number of records and the last key are stored on the response, so
+        that `get_next_page_token` needs no second decode of the page.
+        """
+        keyset = self.keyset_filter_type_id is not None
+        record_count = 0
+        last_key = None
+        parse_seconds = 0.0
+        started = time.perf_counter()
+        for record in iter_json_array(response.text, self.records_key):
+            record_count += 1
+            if keyset:
+                key = record.get(self.keyset_key)
+                if last_key is not None and key <= last_key:
+                    raise RuntimeError(
+                        f"Keyset pagination of '{self.name}' requires records "
+                        f"sorted by '{self.keyset_key}', got {key} after {last_key}."
+                    )
+                last_key = key
+            parse_seconds += time.perf_counter() - started
+            yield record
+            started = time.perf_counter()
+        parse_seconds += time.perf_counter() - started
+        self.metrics.add_time("parse", parse_seconds)
+        response.record_count = record_count  # type: ignore
+        response.last_key = last_key  # type: ignore
+
+    @property
+    def precise_incremental(self) -> bool:
+        """Return True if incremental syncs filter and stop at the exact bookmark."""
+        return bool(self.replication_key and self.config.get("precise_incremental"))
+
+    @property
+    def pipelined(self) -> bool:
+        """Return True if records are fetched and post-processed ahead of emission."""
+        return bool(self.config.get("pipelined_sync"))
+
+    @property
+    def change_detection(self) -> bool:
+        """Return True if only new or changed records are emitted."""
+        return bool(not self.replication_key and self.config.get("change_detection_db"))
+
+    @property
+    def fingerprints(self) -> FingerprintStore:
+        """Return the fingerprint store shared by all streams of the tap."""
+        return self._tap.fingerprints  # type: ignore
+
+    def get_records(self, context: Optional[dict]) -> Iterable[Dict[str, Any]]:
+        resumed = "checkpoint" in self.get_context_state(context)
+        if self.pipelined:
+            # The pipeline post-processed the records already.
+            records: Iterable[Dict[str, Any]] = (
+                r for r in self.request_records(context) if r is not None
+            )
+        else:
+            records = super().get_records(context)
+        if self.precise_incremental:
+            records = self._records_after_bookmark(records, context)
+        if self.change_detection:
+            records = self._changed_records(records, resumed)
+        yield from records
+        if context and context.get("window_end"):
+            self.get_context_state(context)["window_complete"] = True
+
+    def _changed_records(
+        self, records: Iterable[dict], resumed: bool
+    ) -> Iterable[dict]:
+        """Emit only records whose fingerprint differs from the stored one.
+
+        A fingerprint is staged only after its record has been emitted, and the
+        staged fingerprints are committed by `_sync_records` once the output of
+        the stream is written out. With `emit_tombstones`, records no longer
+        returned by Planfix are emitted as tombstones after a complete sync, i.e.
+        one that did not resume from a checkpoint.
+        """
+        store = self.fingerprints
+        store.rollback(self.name)
+        sync_id = uuid.uuid4().hex
+        primary_keys = self.primary_keys or []
+        unchanged = 0
+        for record in records:
+            key = json.dumps([record.get(name) for name in primary_keys])
+            fingerprint = record_fingerprint(record)
+            if store.get(self.name, key) == fingerprint:
+                unchanged += 1
             else:
-                self.processed_fields[field.get("field", {}).get("name", "name")] = field.get("value")
+                yield record
+            store.put(self.name, key, fingerprint, sync_id)
+        self.logger.info(f"Skipped {unchanged} unchanged records of '{self.name}'.")
+
+        if self.config.get("emit_tombstones") and not resumed:
+            deleted_at = pendulum.now("UTC").isoformat()
+            for key in store.missing_keys(self.name, sync_id):
+                tombstone = dict(zip(primary_keys, json.loads(key)))
+                tombstone["_sdc_deleted_at"] = deleted_at
+                yield tombstone
+                store.delete(self.name, key, sync_id)
 
-        for russian, english in self.fields_name_map.items():
-            if russian in self.processed_fields:
-                self.processed_fields[english] = self.processed_fields.pop(russian)
-        row.update(self.processed_fields)
+    def _records_after_bookmark(
+        self, records: Iterable[dict], context: Optional[dict]
+    ) -> Iterable[dict]:
+        """Drop records at or below the bookmark and stop paging once past it.
+
+        Pages are requested newest first. Paging stops at the first record at or
+        below the bookmark, as long as the records seen so far really came
+        sorted; otherwise old records are only skipped. Keyset pagination sorts
+        pages by key instead, so with it old records are always only skipped.
+        """
+        bookmark = self._starting_timestamp(context)
+        previous = None
+        is_sorted = self.keyset_filter_type_id is None
+        for record in records:
+            value = parse_datetime(record.get(self.replication_key))
+            if value is None:
+                yield record
+                continue
+            if previous is not None and value > previous:
+                is_sorted = False
+            previous = value
+            if bookmark and value <= bookmark:
+                if is_sorted:
+                    self.logger.info(
+                        f"Stream '{self.name}' reached bookmark {bookmark}, "
+                        "stopping pagination."
+                    )
+                    break
+                continue
+            yield record
+
+    def post_process(self, row: dict, context: Optional[dict] = None) -> Optional[dict]:
+        started = time.perf_counter()
+        row = self.field_transformer.transform(row)
+        self.metrics.add_time("post_process", time.perf_counter() - started)
         return row
 
+    @property
+    def writer(self) -> MessageWriter:
+        """Return the Singer message writer shared by all streams of the tap."""
+        return self._tap.writer  # type: ignore
+
+    def _write_schema_message(self) -> None:
+        for schema_message in self._generate_schema_messages():
+            self.writer.write_message(schema_message)
+
+    def _write_record_message(self, record: dict) -> None:
+        if self._partitions is not None:
+            # The SDK copies the date window of the partition into its records.
+            record.pop("window_start", None)
+            record.pop("window_end", None)
+        for record_message in self._generate_record_messages(record):
+            if self.batch_files is None:
+                self.writer.write_message(record_message)
+            elif self.batch_files.write(record_message.stream, record_message.record):
+                self._write_batch_messages()
+
+    def _write_state_message(self) -> None:
+        """Write the stream state, or hold it back until pending batches are out.
+
+        In BATCH mode, a state only goes out after the BATCH messages of all
+        records before it, so that it never runs ahead of the data.
+        """
+        if self.batch_files and self.batch_files.pending:
+            self._pending_state = copy.deepcopy(self.stream_state)
+            return
+        self.writer.write_state(self.name, self.stream_state)
+
+    def _write_batch_messages(self) -> None:
+        """Close the open batch files, announce them and write any held state."""
+        if self.batch_files is None:
+            return
+        for batch_message in self.batch_files.close():
+            self.writer.write_message(batch_message)
+        if self._pending_state is not None:
+            self.writer.write_state(self.name, self._pending_state)
+            self._pending_state = None
+
     @property
     def timeout(self) -> int:
         """Return the request timeout limit in seconds.
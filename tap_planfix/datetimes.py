@@ -0,0 +1,126 @@
+"""Parsing and normalization of Planfix datetime values."""
+
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Optional
+
+import pendulum
+
+PLANFIX_DATETIME_FORMATS = ("%d-%m-%Y %H:%M", "%d-%m-%Y %H:%M:%S", "%d-%m-%Y")
+# Distinct datetime strings remembered. Rows share dates heavily, and every
+# entry is a few hundred bytes.
+MEMO_SIZE = 1 << 16
+
+
+def _parse_fixed(value: str) -> Optional[datetime]:
+    """Parse the fixed formats Planfix returns, without `strptime`.
+
+    These are `value.datetime` strings like `2022-03-10T14:30Z`, with optional
+    seconds, and `%d-%m-%Y` dates with an optional `%H:%M` or `%H:%M:%S` time.
+    """
+    length = len(value)
+    try:
+        if (
+            length in (17, 20)
+            and value[4] == "-"
+            and value[10] == "T"
+            and value[13] == ":"
+            and value[-1] == "Z"
+        ):
+            second = int(value[17:19]) if length == 20 else 0
+            return datetime(
+                int(value[0:4]),
+                int(value[5:7]),
+                int(value[8:10]),
+                int(value[11:13]),
+                int(value[14:16]),
+                second,
+                tzinfo=timezone.utc,
+            )
+        if length in (10, 16, 19) and value[2] == "-" and value[5] == "-":
+            hour = minute = second = 0
+            if length > 10:
+                if value[10] != " " or value[13] != ":":
+                    return None
+                hour, minute = int(value[11:13]), int(value[14:16])
+            if length == 19:
+                second = int(value[17:19])
+            return datetime(
+                int(value[6:10]),
+                int(value[3:5]),
+                int(value[0:2]),
+                hour,
+                minute,
+                second,
+                tzinfo=timezone.utc,
+            )
+    except ValueError:
+        return None
+    return None
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _parse_text(value: str) -> Optional[datetime]:
+    parsed = _parse_fixed(value)
+    if parsed is not None:
+        return parsed
+    for fmt in PLANFIX_DATETIME_FORMATS:
+        try:
+            parsed = datetime.strptime(value, fmt)
+            break
+        except ValueError:
+            continue
+    if parsed is None:
+        try:
+            parsed_any = pendulum.parse(value, tz="UTC")
+        except ValueError:
+            return None
+        # Durations and bare times carry no point in time.
+        if not isinstance(parsed_any, datetime):
+            return None
+        parsed = parsed_any
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def parse_datetime(value: Any) -> Optional[datetime]:
+    """Parse a Planfix or ISO-8601 datetime string into an aware datetime.
+
+    Values without a timezone are taken as UTC. Returns None for empty or
+    unparseable values.
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value
+    return _parse_text(value)
+
+
+def parse_iso_datetime(value: str) -> pendulum.DateTime:
+    """Parse an ISO-8601 datetime string, such as a bookmark or a window bound.
+
+    Raises ValueError for strings that are not a point in time.
+    """
+    parsed = pendulum.parse(value, tz="UTC")
+    if not isinstance(parsed, pendulum.DateTime):
+        raise ValueError(f"Not a datetime: {value!r}")
+    return parsed
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _normalize_text(value: str) -> str:
+    parsed = _parse_text(value)
+    return parsed.isoformat() if parsed is not None else value
+
+
+def normalize_datetime(value: Any) -> Any:
+    """Return a Planfix datetime string as ISO-8601 with timezone.
+
+    Other values, and strings that are not datetimes, are returned unchanged.
+    """
+    if not value or not isinstance(value, str):
+        return value
+    return _normalize_text(value)
@@ -0,0 +1,100 @@
+"""On-disk cache of the Planfix custom field columns of every stream."""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def metadata_hash(fields: Iterable[dict]) -> str:
+    """Return a stable hash of custom field metadata, ignoring its order."""
+    entries = sorted(
+        (field.get("id"), field.get("name"), field.get("type")) for field in fields
+    )
+    return hashlib.sha256(json.dumps(entries, default=str).encode()).hexdigest()
+
+
+def resolve_field_columns(
+    fields: Iterable[dict],
+    fields_name_map: Dict[str, str],
+    properties: Iterable[str],
+    known: Optional[Dict[int, str]] = None,
+) -> Tuple[Dict[int, str], List[int]]:
+    """Return the output column of every custom field id, and the renamed ids.
+
+    A field maps to the column `fields_name_map` gives for its current name, or
+    to a column of the same name. A field whose name no longer leads to a
+    column keeps the column it had in `known`, and is reported as renamed.
+    """
+    properties = set(properties)
+    known = known or {}
+    columns: Dict[int, str] = {}
+    renamed = []
+    for field in fields:
+        field_id, name = field["id"], field.get("name", "")
+        column = fields_name_map.get(name, name)
+        if column in properties:
+            columns[field_id] = column
+        elif field_id in known:
+            columns[field_id] = known[field_id]
+            renamed.append(field_id)
+    return columns, renamed
+
+
+class FieldCache:
+    """JSON file of the custom field columns of every stream, by field id.
+
+    Each stream entry holds the columns, the hash of the field metadata they
+    were resolved from and when that metadata was last read. Entries younger
+    than `ttl` seconds are used without asking Planfix. The file is read again
+    before every update and replaced atomically, so that concurrent tap runs
+    neither read half of it nor drop the entries of one another.
+    """
+
+    def __init__(self, path: str, ttl: float) -> None:
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, encoding="utf-8") as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, stream_name: str) -> Optional[dict]:
+        """Return the entry of a stream, fresh or not."""
+        with self._lock:
+            return self._entries.get(stream_name)
+
+    def is_fresh(self, entry: dict) -> bool:
+        """Return True if the metadata of `entry` was read less than `ttl` ago."""
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    @staticmethod
+    def columns(entry: dict) -> Dict[int, str]:
+        """Return the columns of an entry by field id."""
+        return {int(field_id): column for field_id, column in entry["columns"].items()}
+
+    def put(self, stream_name: str, digest: str, columns: Dict[int, str]) -> None:
+        """Store the columns resolved from metadata with hash `digest`."""
+        entry = {
+            "fetched_at": time.time(),
+            "hash": digest,
+            "columns": {str(field_id): column for field_id, column in columns.items()},
+        }
+        with self._lock:
+            self._entries = {**self._load(), stream_name: entry}
+            self._save()
+
+    def _save(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        temporary_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as cache_file:
+            json.dump(self._entries, cache_file, ensure_ascii=False, indent=2)
+        os.replace(temporary_path, self.path)
@@ -0,0 +1,124 @@
+"""On-disk index of record fingerprints for change detection."""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from typing import Iterator, Optional
+
+
+def record_fingerprint(record: dict) -> bytes:
+    """Return a stable hash of a post-processed record."""
+    encoded = json.dumps(record, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=16).digest()
+
+
+class FingerprintStore:
+    """SQLite table of the last emitted fingerprint of every record.
+
+    Rows are keyed by stream name and JSON-encoded primary key. Every key seen
+    during a sync is stamped with the id of that sync, so keys left with an older
+    id after a complete sync no longer exist upstream. Changes of a stream are
+    staged in a table of their own and only take effect on `commit` of that
+    stream, so that streams syncing in parallel never make the changes of one
+    another durable; an interrupted sync leaves the previous fingerprints intact.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints ("
+                " stream TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " fingerprint BLOB NOT NULL,"
+                " sync_id TEXT NOT NULL,"
+                " PRIMARY KEY (stream, key)"
+                ") WITHOUT ROWID"
+            )
+            # Staged changes; a NULL fingerprint deletes the key.
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS staged_fingerprints ("
+                " stream TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " fingerprint BLOB,"
+                " sync_id TEXT NOT NULL,"
+                " PRIMARY KEY (stream, key)"
+                ") WITHOUT ROWID"
+            )
+            self._connection.commit()
+
+    def get(self, stream: str, key: str) -> Optional[bytes]:
+        """Return the committed fingerprint of a record, if any."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT fingerprint FROM fingerprints WHERE stream = ? AND key = ?",
+                (stream, key),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, stream: str, key: str, fingerprint: bytes, sync_id: str) -> None:
+        """Stage the fingerprint of a record seen during `sync_id`."""
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO staged_fingerprints VALUES (?, ?, ?, ?)",
+                (stream, key, fingerprint, sync_id),
+            )
+
+    def missing_keys(self, stream: str, sync_id: str) -> Iterator[str]:
+        """Yield keys of `stream` that were not seen during `sync_id`."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT key FROM fingerprints AS f"
+                " WHERE stream = ? AND sync_id != ? AND NOT EXISTS ("
+                "  SELECT 1 FROM staged_fingerprints AS s"
+                "  WHERE s.stream = f.stream AND s.key = f.key AND s.sync_id = ?"
+                " )",
+                (stream, sync_id, sync_id),
+            ).fetchall()
+        for (key,) in rows:
+            yield key
+
+    def delete(self, stream: str, key: str, sync_id: str) -> None:
+        """Stage forgetting a record."""
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO staged_fingerprints VALUES (?, ?, NULL, ?)",
+                (stream, key, sync_id),
+            )
+
+    def rollback(self, stream: str) -> None:
+        """Drop the staged changes of `stream`, e.g. of an interrupted sync."""
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM staged_fingerprints WHERE stream = ?", (stream,)
+            )
+            self._connection.commit()
+
+    def commit(self, stream: str) -> None:
+        """Make the staged changes of `stream` durable, in one transaction."""
+        with self._lock:
+            connection = self._connection
+            connection.execute(
+                "INSERT OR REPLACE INTO fingerprints"
+                " SELECT stream, key, fingerprint, sync_id FROM staged_fingerprints"
+                " WHERE stream = ? AND fingerprint IS NOT NULL",
+                (stream,),
+            )
+            connection.execute(
+                "DELETE FROM fingerprints WHERE stream = ? AND key IN ("
+                " SELECT key FROM staged_fingerprints"
+                " WHERE stream = ? AND fingerprint IS NULL"
+                ")",
+                (stream, stream),
+            )
+            connection.execute(
+                "DELETE FROM staged_fingerprints WHERE stream = ?", (stream,)
+            )
+            connection.commit()
+
+    def close(self) -> None:
+        """Close the database, dropping changes staged since the last commit."""
+        with self._lock:
+            self._connection.close()
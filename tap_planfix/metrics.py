@@ -0,0 +1,172 @@
+"""Per-stream performance metrics of a tap run."""
+
+import os
+import threading
+import time
+from typing import Any, Dict, List
+
+# Upper bounds in seconds of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TIMERS = ("parse", "post_process", "retry_wait")
+
+
+class StreamMetrics:
+    """Counters and timers of one stream, safe to update from any thread.
+
+    Requests are counted into a latency histogram along with their response
+    size. Time spent parsing responses, in `post_process` and waiting between
+    retries is summed per timer.
+    """
+
+    def __init__(self, stream_name: str) -> None:
+        self.stream_name = stream_name
+        self.started = time.monotonic()
+        self.requests = 0
+        self.request_seconds = 0.0
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.response_bytes = 0
+        self.pages = 0
+        self.records = 0
+        self.timers = dict.fromkeys(TIMERS, 0.0)
+        self._reported = self.started
+        self._lock = threading.Lock()
+
+    def observe_request(self, seconds: float, size_bytes: int) -> None:
+        """Count a response that took `seconds` and held `size_bytes`."""
+        bucket = len(LATENCY_BUCKETS)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                bucket = index
+                break
+        with self._lock:
+            self.requests += 1
+            self.request_seconds += seconds
+            self.latency_counts[bucket] += 1
+            self.response_bytes += size_bytes
+
+    def observe_page(self, records: int) -> None:
+        """Count a page of `records` handed to the stream."""
+        with self._lock:
+            self.pages += 1
+            self.records += records
+
+    def add_time(self, timer: str, seconds: float) -> None:
+        """Add `seconds` to one of `TIMERS`."""
+        with self._lock:
+            self.timers[timer] += seconds
+
+    def due(self, interval: float) -> bool:
+        """Return True once every `interval` seconds, for periodic reporting."""
+        now = time.monotonic()
+        if now - self._reported < interval:
+            return False
+        self._reported = now
+        return True
+
+    def points(self) -> List[Dict[str, Any]]:
+        """Return the metrics as Singer metric points.
+
+        Latency buckets are cumulative, like Prometheus histogram buckets.
+        """
+        tags = {"stream": self.stream_name}
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            points = [
+                ("counter", "http_request_count", self.requests, tags),
+                ("timer", "http_request_duration", self.request_seconds, tags),
+                ("counter", "response_bytes", self.response_bytes, tags),
+                ("counter", "page_count", self.pages, tags),
+                ("counter", "fetched_record_count", self.records, tags),
+                ("gauge", "pages_per_second", self.pages / elapsed, tags),
+                ("gauge", "records_per_second", self.records / elapsed, tags),
+            ]
+            points += [
+                ("timer", f"{timer}_duration", seconds, tags)
+                for timer, seconds in self.timers.items()
+            ]
+            cumulative = 0
+            bounds = [str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]
+            for bound, count in zip(bounds, self.latency_counts):
+                cumulative += count
+                points.append(
+                    (
+                        "counter",
+                        "http_request_duration_bucket",
+                        cumulative,
+                        {**tags, "le": bound},
+                    )
+                )
+        return [
+            {"type": kind, "metric": metric, "value": value, "tags": point_tags}
+            for kind, metric, value, point_tags in points
+        ]
+
+
+def _prometheus_sample(point: Dict[str, Any]) -> str:
+    """Return a metric point as a Prometheus sample line."""
+    metric, kind = point["metric"], point["type"]
+    if metric == "http_request_duration_bucket":
+        name = "planfix_http_request_duration_seconds_bucket"
+    elif metric == "http_request_duration":
+        name = "planfix_http_request_duration_seconds_sum"
+    elif metric == "http_request_count":
+        name = "planfix_http_request_duration_seconds_count"
+    elif kind == "timer":
+        name = f"planfix_{metric[: -len('_duration')]}_seconds_total"
+    elif kind == "gauge":
+        name = f"planfix_{metric}"
+    elif metric.endswith("_count"):
+        name = f"planfix_{metric[: -len('_count')]}_total"
+    else:
+        name = f"planfix_{metric}_total"
+    labels = ",".join(f'{key}="{value}"' for key, value in point["tags"].items())
+    return f"{name}{{{labels}}} {point['value']}"
+
+
+class MetricsRegistry:
+    """The metrics of all streams of a tap run."""
+
+    def __init__(self) -> None:
+        self._streams: Dict[str, StreamMetrics] = {}
+        self._lock = threading.Lock()
+        # Streams syncing in parallel write the textfile, one at a time.
+        self._textfile_lock = threading.Lock()
+
+    def for_stream(self, stream_name: str) -> StreamMetrics:
+        """Return the metrics of a stream, created on first use."""
+        with self._lock:
+            if stream_name not in self._streams:
+                self._streams[stream_name] = StreamMetrics(stream_name)
+            return self._streams[stream_name]
+
+    def prometheus_text(self) -> str:
+        """Return the metrics of all streams in the Prometheus text format."""
+        with self._lock:
+            streams = list(self._streams.values())
+        families: Dict[str, List[str]] = {}
+        for stream in streams:
+            for point in stream.points():
+                sample = _prometheus_sample(point)
+                name = sample.split("{", 1)[0]
+                if name.startswith("planfix_http_request_duration_seconds"):
+                    name = "planfix_http_request_duration_seconds"
+                families.setdefault(name, []).append(sample)
+        lines = []
+        for name, samples in families.items():
+            if name == "planfix_http_request_duration_seconds":
+                kind = "histogram"
+            elif name.endswith("_total"):
+                kind = "counter"
+            else:
+                kind = "gauge"
+            lines.append(f"# TYPE {name} {kind}")
+            lines += samples
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """Replace `path` with the current metrics, for the node exporter."""
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with self._textfile_lock:
+            with open(temporary_path, "w", encoding="utf-8") as textfile:
+                textfile.write(self.prometheus_text())
+            os.replace(temporary_path, path)
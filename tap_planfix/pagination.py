@@ -0,0 +1,235 @@
+"""Pagination helpers for Planfix list endpoints."""
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Generator, Iterable, List, Optional, Tuple
+
+
+class PageSizeController:
+    """Adapt the `pageSize` of a stream to the observed cost of its pages.
+
+    The size doubles while pages come back faster and smaller than half of the
+    targets, halves when a page exceeds either target or fails, and always stays
+    within `[minimum, maximum]`.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        target_latency: float,
+        target_bytes: int,
+    ) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.target_bytes = target_bytes
+        self._size = min(max(initial, minimum), maximum)
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """Return the page size to use for the next request."""
+        return self._size
+
+    def record_page(self, latency: float, size_bytes: int) -> None:
+        """Adjust the page size after a successful page."""
+        with self._lock:
+            if latency > self.target_latency or size_bytes > self.target_bytes:
+                self._size = max(self._size // 2, self.minimum)
+            elif (
+                latency < self.target_latency / 2 and size_bytes < self.target_bytes / 2
+            ):
+                self._size = min(self._size * 2, self.maximum)
+
+    def record_failure(self) -> None:
+        """Back off after a failed or timed out page."""
+        with self._lock:
+            self._size = max(self._size // 2, self.minimum)
+
+
+class _Failure:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+class PartitionPrefetcher:
+    """Fetch the pages of several partitions at once on a bounded pool.
+
+    Partitions start in the order they were submitted, at most `concurrency` at
+    a time, so the partition being consumed is always running or done. Each
+    partition runs at most `buffer` pages ahead of its consumer. Pages of a
+    partition whose consumer stops early, or of any partition after `close`,
+    are no longer requested.
+    """
+
+    _DONE = object()
+
+    def __init__(self, concurrency: int, buffer: int = 2) -> None:
+        self.buffer = buffer
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._partitions: Dict[str, Tuple[queue.Queue, threading.Event]] = {}
+        self._closed = threading.Event()
+
+    def submit(self, key: str, fetch_pages: Callable[[], Iterable[Any]]) -> None:
+        """Start fetching the pages of partition `key` in the background."""
+        pages: queue.Queue = queue.Queue(maxsize=self.buffer)
+        stopped = threading.Event()
+        self._partitions[key] = (pages, stopped)
+        self._executor.submit(self._produce, fetch_pages, pages, stopped)
+
+    def take(self, key: str) -> Optional[Generator[Any, None, None]]:
+        """Return the pages of partition `key`, or None if it was not submitted."""
+        entry = self._partitions.pop(key, None)
+        if entry is None:
+            return None
+        return self._consume(*entry)
+
+    def close(self) -> None:
+        """Stop all partitions and wait for requests in flight."""
+        self._closed.set()
+        self._executor.shutdown(wait=True)
+
+    def _put(self, pages: queue.Queue, stopped: threading.Event, item: Any) -> bool:
+        while not (stopped.is_set() or self._closed.is_set()):
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(
+        self,
+        fetch_pages: Callable[[], Iterable[Any]],
+        pages: queue.Queue,
+        stopped: threading.Event,
+    ) -> None:
+        if stopped.is_set() or self._closed.is_set():
+            return
+        fetched = iter(fetch_pages())
+        try:
+            for page in fetched:
+                if not self._put(pages, stopped, page):
+                    return
+        except BaseException as error:  # Re-raised in the consumer thread.
+            self._put(pages, stopped, _Failure(error))
+            return
+        finally:
+            close = getattr(fetched, "close", None)
+            if close:
+                close()
+        self._put(pages, stopped, self._DONE)
+
+    def _consume(
+        self, pages: queue.Queue, stopped: threading.Event
+    ) -> Generator[Any, None, None]:
+        try:
+            while True:
+                item = pages.get()
+                if item is self._DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        finally:
+            stopped.set()
+
+
+class PagePipeline:
+    """Fetch pages and transform their records ahead of the consumer.
+
+    A fetch thread pulls pages from `pages`, decoding their records, and a
+    transform thread applies `transform` to every record of a page, while the
+    consumer handles the pages before. Each stage runs at most `buffer` pages
+    ahead of the next one, so a slow consumer stalls both stages instead of
+    letting pages pile up. Errors of either stage are re-raised in the
+    consumer, and closing the pipeline stops both stages.
+    """
+
+    _DONE = object()
+
+    def __init__(
+        self,
+        pages: Iterable[Tuple[Any, Iterable[dict]]],
+        transform: Callable[[dict], Optional[dict]],
+        buffer: int = 4,
+    ) -> None:
+        self._stopped = threading.Event()
+        self._fetched: queue.Queue = queue.Queue(maxsize=buffer)
+        self._transformed: queue.Queue = queue.Queue(maxsize=buffer)
+        self._threads = [
+            threading.Thread(target=self._fetch, args=(pages,), daemon=True),
+            threading.Thread(target=self._transform, args=(transform,), daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __iter__(self) -> Generator[Tuple[Any, List[Optional[dict]]], None, None]:
+        """Yield the pages in order, each with its transformed records."""
+        try:
+            while True:
+                item = self._transformed.get()
+                if item is self._DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Stop both stages and wait for them, including a request in flight."""
+        self._stopped.set()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+
+    def _put(self, stage: queue.Queue, item: Any) -> bool:
+        while not self._stopped.is_set():
+            try:
+                stage.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, stage: queue.Queue) -> Any:
+        while not self._stopped.is_set():
+            try:
+                return stage.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return self._DONE
+
+    def _fetch(self, pages: Iterable[Tuple[Any, Iterable[dict]]]) -> None:
+        fetched = iter(pages)
+        try:
+            for page_token, records in fetched:
+                if not self._put(self._fetched, (page_token, list(records))):
+                    return
+        except BaseException as error:  # Re-raised in the consumer thread.
+            self._put(self._fetched, _Failure(error))
+            return
+        finally:
+            close = getattr(fetched, "close", None)
+            if close:
+                close()
+        self._put(self._fetched, self._DONE)
+
+    def _transform(self, transform: Callable[[dict], Optional[dict]]) -> None:
+        while True:
+            item = self._get(self._fetched)
+            if item is self._DONE or isinstance(item, _Failure):
+                self._put(self._transformed, item)
+                return
+            page_token, records = item
+            try:
+                transformed = [transform(record) for record in records]
+            except BaseException as error:  # Re-raised in the consumer thread.
+                self._put(self._transformed, _Failure(error))
+                return
+            if not self._put(self._transformed, (page_token, transformed)):
+                return
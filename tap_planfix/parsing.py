@@ -0,0 +1,55 @@
+"""Incremental decoding of Planfix list responses."""
+
+import json
+import re
+from typing import Any, Iterator
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*")
+
+
+def _skip_whitespace(document: str, index: int) -> int:
+    return _whitespace.match(document, index).end()  # type: ignore
+
+
+def _expect(document: str, index: int, char: str) -> int:
+    if document[index : index + 1] != char:
+        raise json.JSONDecodeError(f"Expecting '{char}'", document, index)
+    return _skip_whitespace(document, index + 1)
+
+
+def iter_json_array(document: str, key: str) -> Iterator[Any]:
+    """Yield the items of the array stored under `key` of a JSON object.
+
+    The document is decoded in a single pass and each array item is yielded as
+    soon as it is decoded, so the full page tree is never built. Other top-level
+    values are decoded and dropped. Yields nothing when the document is empty,
+    the key is missing or its value is not an array.
+    """
+    decode = _decoder.raw_decode
+    index = _skip_whitespace(document, 0)
+    if index == len(document):
+        return
+    index = _expect(document, index, "{")
+    if document[index : index + 1] == "}":
+        return
+    while True:
+        name, index = decode(document, index)
+        index = _skip_whitespace(document, index)
+        index = _expect(document, index, ":")
+        if name == key and document[index : index + 1] == "[":
+            index = _skip_whitespace(document, index + 1)
+            if document[index : index + 1] == "]":
+                return
+            while True:
+                item, index = decode(document, index)
+                yield item
+                index = _skip_whitespace(document, index)
+                if document[index : index + 1] == "]":
+                    return
+                index = _expect(document, index, ",")
+        _, index = decode(document, index)
+        index = _skip_whitespace(document, index)
+        if document[index : index + 1] == "}":
+            return
+        index = _expect(document, index, ",")
@@ -0,0 +1,88 @@
+"""Request rate limiting shared by all Planfix streams of a tap run."""
+
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Return the delay in seconds of a `Retry-After` header value."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class RequestScheduler:
+    """Token bucket admitting requests at `rate` per second, in bursts of `burst`.
+
+    Requests of priority callers are admitted before any waiting request of a
+    regular caller. `pause` stops admitting requests, e.g. for the duration of a
+    `Retry-After` or until a spent quota resets.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting_priority = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, priority: bool = False) -> None:
+        """Block until a request may be sent."""
+        with self._condition:
+            if priority:
+                self._waiting_priority += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._tokens = min(
+                        self._tokens + (now - self._updated) * self.rate, self.burst
+                    )
+                    self._updated = now
+                    timeout: Optional[float]
+                    if now < self._paused_until:
+                        timeout = self._paused_until - now
+                    elif not priority and self._waiting_priority:
+                        timeout = None
+                    elif self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    else:
+                        timeout = (1 - self._tokens) / self.rate
+                    self._condition.wait(timeout)
+            finally:
+                if priority:
+                    self._waiting_priority -= 1
+                    self._condition.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """Admit no request for the next `seconds`."""
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+    def observe(self, status_code: int, headers: Mapping[str, str]) -> None:
+        """Pause on `429 Too Many Requests` or a spent quota."""
+        delay = None
+        if status_code == 429:
+            delay = parse_retry_after(headers.get("Retry-After"))
+            if delay is None:
+                delay = 1 / self.rate
+        elif headers.get("X-RateLimit-Remaining") == "0":
+            delay = parse_retry_after(headers.get("X-RateLimit-Reset"))
+            if delay and delay > 1e9:
+                # An epoch timestamp rather than a number of seconds.
+                delay = max(delay - time.time(), 0.0)
+        if delay:
+            self.pause(delay)
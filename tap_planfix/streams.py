@@ -1,4 +1,6 @@
 """Stream type classes for tap-planfix."""
+from typing import List, Type
+
 from singer_sdk import typing as th  # JSON Schema typing helpers
 from singer_sdk.helpers.jsonpath import extract_jsonpath
 
@@ -8,6 +10,7 @@ from tap_planfix.client import PlanfixStream
 class ContactsStream(PlanfixStream):
     name = "planfix_contacts"
     path = "/contact/list"
+    field_metadata_path = "/customfield/contact"
     primary_keys = ["id"]  # type: ignore
     records_jsonpath = "$.contacts[*]"
     fields = "id,name,lastname,email,phones,47368,47376,47378,47666,47676,47682,47918,47920,47924,47932,47938"
@@ -51,6 +54,7 @@ class ContactsStream(PlanfixStream):
 class TasksStream(PlanfixStream):
     name = "planfix_tasks"
     path = "/task/list"
+    field_metadata_path = "/customfield/task"
     primary_keys = ["id"]  # type: ignore
     replication_key = "updated_at"  # type: ignore
     records_jsonpath = "$.tasks[*]"
@@ -110,14 +114,94 @@ class TasksStream(PlanfixStream):
     ).to_dict()  # type: ignore
 
 
-class CashInflowStream(PlanfixStream):
-    name = "planfix_cash_in"
-    path = "/datatag/7052/entry/list"
+# JSON schema types of `datatags` config columns.
+DATATAG_COLUMN_TYPES = {
+    "string": th.StringType,
+    "integer": th.IntegerType,
+    "number": th.NumberType,
+    "boolean": th.BooleanType,
+    "date-time": th.DateTimeType,
+}
+
+
+class DataTagStream(PlanfixStream):
+    """Entries of a Planfix datatag, read from `/datatag/{datatag_id}/entry/list`.
+
+    Subclasses set the datatag id, the custom fields and their columns. Streams
+    for further datatags are built from `datatags` config entries by
+    `from_config`.
+    """
+
+    datatag_id = 0
     primary_keys = ["key"]  # type: ignore
-    replication_key = "created_at"  # type: ignore
     records_jsonpath = "$.dataTagEntries[*]"
-    fields = "dataTag,key,30008,30010,30012,30014,30016,30018"
     filter_field_type_id = 3101
+
+    @property
+    def path(self) -> str:  # type: ignore
+        return f"/datatag/{self.datatag_id}/entry/list"
+
+    @property
+    def field_metadata_path(self) -> str:  # type: ignore
+        return f"/customfield/datatag/{self.datatag_id}"
+
+    @classmethod
+    def from_config(cls, entry: dict) -> Type["DataTagStream"]:
+        """Return the stream class of a `datatags` config entry.
+
+        Every field of the entry names a Planfix custom field by `id`, and
+        optionally `name`, and the `column` and `type` it is emitted as. Fields
+        are mapped to their columns by id. The date filter
+        of an incremental stream is on the field of its `replication_key`
+        column, unless `filter_field_id` says otherwise.
+        """
+        fields = entry.get("fields") or []
+        replication_key = entry.get("replication_key")
+        filter_field_id = entry.get("filter_field_id") or 0
+        properties: List[th.Property] = [
+            th.Property("dataTag", th.StringType),
+            th.Property("key", th.IntegerType),
+        ]
+        for field in fields:
+            column_type = field.get("type") or "string"
+            if column_type not in DATATAG_COLUMN_TYPES:
+                raise ValueError(
+                    f"Unknown type '{column_type}' of column '{field['column']}' "
+                    f"in datatag stream '{entry['name']}', expected one of "
+                    f"{', '.join(DATATAG_COLUMN_TYPES)}."
+                )
+            properties.append(
+                th.Property(field["column"], DATATAG_COLUMN_TYPES[column_type])
+            )
+            if field["column"] == replication_key and not filter_field_id:
+                filter_field_id = field["id"]
+        if replication_key and not filter_field_id:
+            raise ValueError(
+                f"Replication key '{replication_key}' of datatag stream "
+                f"'{entry['name']}' is not a column of its fields."
+            )
+
+        attributes = {
+            "name": entry["name"],
+            "datatag_id": entry["datatag_id"],
+            "fields": ",".join(["dataTag", "key"] + [str(f["id"]) for f in fields]),
+            "fields_name_map": {
+                field["name"]: field["column"] for field in fields if field.get("name")
+            },
+            "field_ids": {field["id"]: field["column"] for field in fields},
+            "filter_field_id": filter_field_id,
+            "schema": th.PropertiesList(*properties).to_dict(),
+        }
+        if replication_key:
+            attributes["replication_key"] = replication_key
+        return type(f"DataTag{entry['datatag_id']}Stream", (cls,), attributes)
+
+
+class CashInflowStream(DataTagStream):
+    name = "planfix_cash_in"
+    datatag_id = 7052
+    replication_key = "created_at"  # type: ignore
+    fields = "dataTag,key,30008,30010,30012,30014,30016,30018"
     filter_field_id = 30008
     fields_name_map = {
         "Сумма": "Sum",
@@ -139,14 +223,11 @@ class CashInflowStream(PlanfixStream):
     ).to_dict()  # type: ignore
 
 
-class CompletedRequestsStream(PlanfixStream):
+class CompletedRequestsStream(DataTagStream):
     name = "planfix_completed_request"
-    path = "/datatag/7064/entry/list"
-    primary_keys = ["key"]  # type: ignore
+    datatag_id = 7064
     replication_key = "Finished_at_datetime"  # type: ignore
-    records_jsonpath = "$.dataTagEntries[*]"
     fields = "dataTag,key,30094,30108,30096,30098,30348,30100,30262,30102,30104,30106,30110,30120"
-    filter_field_type_id = 3101
     filter_field_id = 30098
     fields_name_map = {
         "Исполнитель": "Executor",
@@ -178,14 +259,11 @@ class CompletedRequestsStream(PlanfixStream):
     ).to_dict()  # type: ignore
 
 
-class FirstResponseStream(PlanfixStream):
+class FirstResponseStream(DataTagStream):
     name = "planfix_first_response"
-    path = "/datatag/7066/entry/list"
-    primary_keys = ["key"]  # type: ignore
+    datatag_id = 7066
     replication_key = "First_response_datetime"  # type: ignore
-    records_jsonpath = "$.dataTagEntries[*]"
     fields = "dataTag,key,30112,30114,30116,30118,30220"
-    filter_field_type_id = 3101
     filter_field_id = 30116
     fields_name_map = {
         "Исполнитель": "Executor",
@@ -205,14 +283,11 @@ class FirstResponseStream(PlanfixStream):
     ).to_dict()  # type: ignore
 
 
-class TaskAcceptanceStream(PlanfixStream):
+class TaskAcceptanceStream(DataTagStream):
     name = "planfix_task_acceptance"
-    path = "/datatag/7092/entry/list"
-    primary_keys = ["key"]  # type: ignore
+    datatag_id = 7092
     replication_key = "Acceptance_datetime"  # type: ignore
-    records_jsonpath = "$.dataTagEntries[*]"
     fields = "dataTag,key,30308,30310"
-    filter_field_type_id = 3101
     filter_field_id = 30308
     fields_name_map = {
         "Принявший сотрудник": "Accepted_employee",
@@ -226,14 +301,11 @@ class TaskAcceptanceStream(PlanfixStream):
     ).to_dict()  # type: ignore
 
 
-class LeadsStream(PlanfixStream):
+class LeadsStream(DataTagStream):
     name = "planfix_leads"
-    path = "/datatag/7098/entry/list"
-    primary_keys = ["key"]  # type: ignore
+    datatag_id = 7098
     # replication_key = "Lead_creation_datetime"  # type: ignore
-    records_jsonpath = "$.dataTagEntries[*]"
     fields = "dataTag,key,30350,30352,30382,30384,30386,30388,30398,30404,30362,30364,30366"
-    filter_field_type_id = 3101
     filter_field_id = 30388
     fields_name_map = {
         "Исполнитель": "Executor",
@@ -265,14 +337,11 @@ class LeadsStream(PlanfixStream):
     ).to_dict()  # type: ignore
 
 
-class ContributionToDealStream(PlanfixStream):
+class ContributionToDealStream(DataTagStream):
     name = "planfix_contribution_to_deal"
-    path = "/datatag/7100/entry/list"
-    primary_keys = ["key"]  # type: ignore
+    datatag_id = 7100
     replication_key = "Push_datetime"  # type: ignore
-    records_jsonpath = "$.dataTagEntries[*]"
     fields = "dataTag,key,30374,30370,30394"
-    filter_field_type_id = 3101
     filter_field_id = 30374
     fields_name_map = {
         "Дата пуша": "Push_datetime",
@@ -289,11 +358,9 @@ class ContributionToDealStream(PlanfixStream):
     ).to_dict()  # type: ignore
 
 
-class PingsStream(PlanfixStream):
+class PingsStream(DataTagStream):
     name = "planfix_pings"
-    path = "/datatag/7086/entry/list"
-    primary_keys = ["key"]  # type: ignore
-    records_jsonpath = "$.dataTagEntries[*]"
+    datatag_id = 7086
     fields = "dataTag,key,30312,30326,30328,30330,30332,30334,30336,30324"
     fields_name_map = {
         "Путешественник": "Traveler",
@@ -1,12 +1,14 @@
 """Planfix tap class."""
 
-from typing import List
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import List, Optional, Type
 
 from singer_sdk import Tap, Stream
 from singer_sdk import typing as th  # JSON schema typing helpers
 
 from tap_planfix.streams import (
-    PlanfixStream,
+    DataTagStream,
     ContactsStream,
     TasksStream,
     CashInflowStream,
@@ -17,6 +19,12 @@ from tap_planfix.streams import (
     ContributionToDealStream,
     PingsStream
 )
+from tap_planfix.fieldcache import FieldCache
+from tap_planfix.fingerprints import FingerprintStore
+from tap_planfix.metrics import MetricsRegistry
+from tap_planfix.ratelimit import RequestScheduler
+from tap_planfix.transport import PlanfixTransport
+from tap_planfix.writer import MessageWriter
 
 STREAM_TYPES = [
     ContactsStream,
@@ -43,8 +51,332 @@ class TapPlanfix(Tap):
         ),
         th.Property("planfix_token", th.StringType),
         th.Property("start_date", th.DateType),
+        th.Property(
+            "page_concurrency",
+            th.IntegerType,
+            description="Number of offset pages kept in flight per stream.",
+        ),
+        th.Property(
+            "partition_window_days",
+            th.IntegerType,
+            description=(
+                "Sync streams filtered by date as windows of this many days, "
+                "each with its own bookmark."
+            ),
+        ),
+        th.Property(
+            "partition_concurrency",
+            th.IntegerType,
+            description="Number of date windows fetched in parallel per stream.",
+        ),
+        th.Property(
+            "pipelined_sync",
+            th.BooleanType,
+            description=(
+                "Fetch and post-process pages on threads of their own while "
+                "earlier records are written."
+            ),
+        ),
+        th.Property(
+            "pipeline_buffer_pages",
+            th.IntegerType,
+            description="Number of pages each pipeline stage may run ahead.",
+        ),
+        th.Property(
+            "stream_concurrency",
+            th.IntegerType,
+            description="Number of streams synced in parallel.",
+        ),
+        th.Property(
+            "adaptive_page_size",
+            th.BooleanType,
+            description=(
+                "Adapt pageSize of each stream to observed page cost. It starts at "
+                "100, so it only grows above that up to `max_page_size`."
+            ),
+        ),
+        th.Property(
+            "max_page_size",
+            th.IntegerType,
+            description=(
+                "Upper bound for the adaptive pageSize, default 100. Set it higher "
+                "for pageSize to grow."
+            ),
+        ),
+        th.Property(
+            "target_page_latency",
+            th.NumberType,
+            description="Page latency in seconds the adaptive pageSize aims for.",
+        ),
+        th.Property(
+            "target_page_bytes",
+            th.IntegerType,
+            description="Page size in bytes the adaptive pageSize aims for.",
+        ),
+        th.Property(
+            "precise_incremental",
+            th.BooleanType,
+            description="Sync only records newer than the exact bookmark.",
+        ),
+        th.Property(
+            "page_checkpoints",
+            th.BooleanType,
+            description="Keep the sync position in STATE to resume interrupted runs.",
+        ),
+        th.Property(
+            "change_detection_db",
+            th.StringType,
+            description=(
+                "Path of a SQLite file with record fingerprints. Streams without "
+                "a replication key then emit only new or changed records."
+            ),
+        ),
+        th.Property(
+            "emit_tombstones",
+            th.BooleanType,
+            description="Emit records that disappeared with `_sdc_deleted_at` set.",
+        ),
+        th.Property(
+            "field_cache_path",
+            th.StringType,
+            description=(
+                "Path of a JSON file caching the columns of Planfix custom fields, "
+                "resolved from their metadata."
+            ),
+        ),
+        th.Property(
+            "field_cache_ttl",
+            th.NumberType,
+            description="Seconds before cached custom field metadata is read again.",
+        ),
+        th.Property(
+            "keyset_filter_types",
+            th.ObjectType(),
+            description=(
+                "Planfix filter type on the primary key, by stream name. Listed "
+                "streams page by key instead of by offset."
+            ),
+        ),
+        th.Property(
+            "http_pool_size",
+            th.IntegerType,
+            description="Number of pooled HTTP connections shared by all streams.",
+        ),
+        th.Property(
+            "requests_per_second",
+            th.NumberType,
+            description="Planfix request quota shared by all streams.",
+        ),
+        th.Property(
+            "request_burst",
+            th.IntegerType,
+            description="Number of requests that may be sent at once.",
+        ),
+        th.Property(
+            "max_requests_in_flight",
+            th.IntegerType,
+            description="Number of requests all streams may have in flight at once.",
+        ),
+        th.Property(
+            "datatags",
+            th.ArrayType(
+                th.ObjectType(
+                    th.Property("name", th.StringType),
+                    th.Property("datatag_id", th.IntegerType),
+                    th.Property("replication_key", th.StringType),
+                    th.Property("filter_field_id", th.IntegerType),
+                    th.Property(
+                        "fields",
+                        th.ArrayType(
+                            th.ObjectType(
+                                th.Property("id", th.IntegerType),
+                                th.Property("name", th.StringType),
+                                th.Property("column", th.StringType),
+                                th.Property("type", th.StringType),
+                            )
+                        ),
+                    ),
+                )
+            ),
+            description="Further datatags to sync, each as a stream of its own.",
+        ),
+        th.Property(
+            "fast_output",
+            th.BooleanType,
+            description="Encode Singer messages faster and write them in batches.",
+        ),
+        th.Property(
+            "batch_dir",
+            th.StringType,
+            description="Directory for batch files. Records are then sent as BATCH.",
+        ),
+        th.Property(
+            "batch_format",
+            th.StringType,
+            description="Format of batch files, 'jsonl' (gzip) or 'parquet'.",
+        ),
+        th.Property(
+            "batch_max_records",
+            th.IntegerType,
+            description="Number of records per batch file.",
+        ),
+        th.Property(
+            "metrics_interval",
+            th.NumberType,
+            description="Seconds between METRIC logs of each stream during a sync.",
+        ),
+        th.Property(
+            "metrics_textfile",
+            th.StringType,
+            description="Path of a Prometheus textfile updated with stream metrics.",
+        ),
+        th.Property(
+            "profile_dir",
+            th.StringType,
+            description="Directory to save a cProfile profile of every stream sync.",
+        ),
     ).to_dict()
 
     def discover_streams(self) -> List[Stream]:
         """Return a list of discovered streams."""
-        return [stream_class(tap=self) for stream_class in STREAM_TYPES]
+        stream_types = STREAM_TYPES + self.datatag_stream_types
+        streams: List[Stream] = [cls(tap=self) for cls in stream_types]
+        names = [stream.name for stream in streams]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"Duplicate stream names: {', '.join(duplicates)}.")
+        return streams
+
+    @property
+    def datatag_stream_types(self) -> List[Type[DataTagStream]]:
+        """Return the stream classes of the `datatags` config entries."""
+        return [
+            DataTagStream.from_config(entry)
+            for entry in self.config.get("datatags") or []
+        ]
+
+    _writer: Optional[MessageWriter] = None
+
+    @property
+    def writer(self) -> MessageWriter:
+        """Return the Singer message writer shared by all streams."""
+        if self._writer is None:
+            self._writer = MessageWriter(
+                self.state, fast=bool(self.config.get("fast_output"))
+            )
+        return self._writer
+
+    _transport: Optional[PlanfixTransport] = None
+
+    @property
+    def transport(self) -> PlanfixTransport:
+        """Return the HTTP transport shared by all streams."""
+        if self._transport is None:
+            pool_size = (
+                self.config.get("http_pool_size")
+                or self.config.get("max_requests_in_flight")
+                or (
+                    (self.config.get("stream_concurrency") or 1)
+                    * (self.config.get("partition_concurrency") or 1)
+                    * (self.config.get("page_concurrency") or 1)
+                )
+            )
+            self._transport = PlanfixTransport(pool_size=max(pool_size, 10))
+        return self._transport
+
+    _request_scheduler: Optional[RequestScheduler] = None
+
+    @property
+    def request_scheduler(self) -> Optional[RequestScheduler]:
+        """Return the rate limiter shared by all streams, if one is configured."""
+        rate = self.config.get("requests_per_second")
+        if rate and self._request_scheduler is None:
+            burst = self.config.get("request_burst") or max(int(rate), 1)
+            self._request_scheduler = RequestScheduler(rate=rate, burst=burst)
+        return self._request_scheduler
+
+    _request_slots: Optional[threading.BoundedSemaphore] = None
+
+    @property
+    def request_slots(self) -> Optional[threading.BoundedSemaphore]:
+        """Return the request budget shared by all streams, if one is configured.
+
+        Each request holds a slot of `max_requests_in_flight` while it is sent.
+        """
+        slots = self.config.get("max_requests_in_flight")
+        if slots and self._request_slots is None:
+            self._request_slots = threading.BoundedSemaphore(slots)
+        return self._request_slots
+
+    _metrics: Optional[MetricsRegistry] = None
+
+    @property
+    def metrics(self) -> MetricsRegistry:
+        """Return the performance metrics of all streams."""
+        if self._metrics is None:
+            self._metrics = MetricsRegistry()
+        return self._metrics
+
+    _fingerprints: Optional[FingerprintStore] = None
+
+    @property
+    def fingerprints(self) -> FingerprintStore:
+        """Return the record fingerprint store of `change_detection_db`."""
+        if self._fingerprints is None:
+            self._fingerprints = FingerprintStore(self.config["change_detection_db"])
+        return self._fingerprints
+
+    _field_cache: Optional[FieldCache] = None
+
+    @property
+    def field_cache(self) -> FieldCache:
+        """Return the custom field cache of `field_cache_path`."""
+        if self._field_cache is None:
+            self._field_cache = FieldCache(
+                self.config["field_cache_path"],
+                ttl=self.config.get("field_cache_ttl") or 86400,
+            )
+        return self._field_cache
+
+    # `Tap.sync_all` is final, but syncs streams strictly one after another and
+    # offers no hook to run them concurrently. The serial case is left to it.
+    def sync_all(self) -> None:  # type: ignore[misc]
+        """Sync all streams, running up to `stream_concurrency` of them at once."""
+        workers = self.config.get("stream_concurrency") or 1
+        if workers <= 1:
+            super().sync_all()
+            return
+
+        self._reset_state_progress_markers()
+        self._set_compatible_replication_methods()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self._sync_stream, s) for s in self._streams_to_sync()
+            ]
+            done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in not_done:
+                future.cancel()
+            for future in done:
+                future.result()
+
+    def _streams_to_sync(self) -> List[Stream]:
+        """Return the streams `Tap.sync_all` would sync, skipping them the same way."""
+        streams = []
+        for stream in self.streams.values():
+            if not stream.selected and not stream.has_selected_descendents:
+                self.logger.info(f"Skipping deselected stream '{stream.name}'.")
+                continue
+            if stream.parent_stream_type:
+                self.logger.debug(
+                    f"Child stream '{type(stream).__name__}' is expected to be called "
+                    f"by parent stream '{stream.parent_stream_type.__name__}'. "
+                    "Skipping direct invocation."
+                )
+                continue
+            streams.append(stream)
+        return streams
+
+    @staticmethod
+    def _sync_stream(stream: Stream) -> None:
+        stream.sync()
+        stream.finalize_state_progress_markers()
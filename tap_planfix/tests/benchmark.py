@@ -0,0 +1,194 @@
+"""Throughput benchmark of Planfix streams against the offline stand-in.
+
+Every stream is synced in a fresh process, so that its peak RSS is its own,
+from records generated by `fake_planfix`. Singer messages are discarded and a
+table of results is printed instead, e.g.::
+
+    python -m tap_planfix.tests.benchmark --records 20000 > bench_output.txt
+
+CPU time is split into parsing of responses, `post_process`, serialization of
+Singer messages and everything else. CPU spent by the stand-in itself is left
+out of all columns.
+"""
+
+import argparse
+import io
+import json
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import singer
+
+from tap_planfix.tap import TapPlanfix
+from tap_planfix.tests.fake_planfix import FakePlanfixAdapter
+
+BENCHMARK_CONFIG = {
+    "planfix_url": "https://planfix.test/rest",
+    "planfix_token": "token",
+    "start_date": "2010-01-01",
+}
+# Result columns with the format of their values.
+COLUMNS = [
+    ("stream", "<30"),
+    ("records", ">8"),
+    ("seconds", ">8.2f"),
+    ("records_per_second", ">18.0f"),
+    ("requests_per_record", ">19.4f"),
+    ("parse_cpu", ">9.2f"),
+    ("post_process_cpu", ">16.2f"),
+    ("serialize_cpu", ">13.2f"),
+    ("other_cpu", ">9.2f"),
+    ("peak_rss_mib", ">12.1f"),
+]
+
+
+class CpuTimer:
+    """Sum the CPU time of the calling thread spent in wrapped callables."""
+
+    def __init__(self) -> None:
+        self.seconds: Dict[str, float] = {}
+
+    def _add(self, label: str, started: float) -> None:
+        elapsed = time.thread_time() - started
+        self.seconds[label] = self.seconds.get(label, 0.0) + elapsed
+
+    def wrap(self, label: str, function: Callable) -> Callable:
+        """Return `function`, timed under `label`."""
+
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            started = time.thread_time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._add(label, started)
+
+        return timed
+
+    def wrap_generator(self, label: str, function: Callable) -> Callable:
+        """Return generator function `function`, with each step timed."""
+
+        def timed(*args: Any, **kwargs: Any) -> Iterator:
+            iterator = iter(function(*args, **kwargs))
+            while True:
+                started = time.thread_time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self._add(label, started)
+                yield item
+
+        return timed
+
+
+def run_stream(
+    stream_name: str,
+    records: int,
+    latency: float = 0.0,
+    value_length: int = 16,
+    config: Optional[dict] = None,
+) -> Dict[str, Any]:
+    """Sync one stream from `records` generated records and return its numbers."""
+    tap = TapPlanfix(config={**BENCHMARK_CONFIG, **(config or {})})
+    stream = tap.streams[stream_name]
+    adapter = FakePlanfixAdapter.for_streams(
+        [stream], records, value_length=value_length, latency=latency
+    )
+    stream.requests_session.mount("https://", adapter)
+
+    timer = CpuTimer()
+    record_count = 0
+    write_message = tap.writer.write_message
+
+    def count_and_write(message: singer.Message) -> None:
+        nonlocal record_count
+        if isinstance(message, singer.RecordMessage):
+            record_count += 1
+        write_message(message)
+
+    adapter.send = timer.wrap("server", adapter.send)  # type: ignore
+    stream.parse_response = timer.wrap_generator(  # type: ignore
+        "parse", stream.parse_response
+    )
+    post_process = stream.post_process
+    stream.post_process = timer.wrap("post_process", post_process)  # type: ignore
+    tap.writer.write_message = timer.wrap("serialize", count_and_write)  # type: ignore
+    adapter.prepare()
+
+    stdout = sys.stdout
+    sys.stdout = _NullWriter()
+    started, cpu_started = time.perf_counter(), time.process_time()
+    try:
+        stream.sync()
+    finally:
+        sys.stdout = stdout
+    seconds = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+
+    split = timer.seconds
+    measured = sum(split.get(k, 0.0) for k in ("parse", "post_process", "serialize"))
+    return {
+        "stream": stream_name,
+        "records": record_count,
+        "seconds": seconds,
+        "records_per_second": record_count / seconds if seconds else 0.0,
+        "requests_per_record": len(adapter.payloads) / max(record_count, 1),
+        "parse_cpu": split.get("parse", 0.0),
+        "post_process_cpu": split.get("post_process", 0.0),
+        "serialize_cpu": split.get("serialize", 0.0),
+        "other_cpu": max(cpu - measured - split.get("server", 0.0), 0.0),
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+class _NullWriter(io.TextIOBase):
+    """Discard Singer messages."""
+
+    def write(self, text: str) -> int:
+        return len(text)
+
+
+def format_row(result: Dict[str, Any]) -> str:
+    """Return one line of the result table."""
+    return " ".join(format(result[name], fmt) for name, fmt in COLUMNS)
+
+
+def format_header() -> str:
+    """Return the header line of the result table."""
+    return " ".join(format(name, fmt.split(".")[0]) for name, fmt in COLUMNS)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Benchmark the selected streams, one process each."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--value-length", type=int, default=16)
+    parser.add_argument(
+        "--config", type=json.loads, default={}, help="Extra tap config as JSON."
+    )
+    parser.add_argument("--streams", nargs="*", help="Stream names, default all.")
+    args = parser.parse_args(argv)
+
+    stream_names = args.streams or list(TapPlanfix(config=BENCHMARK_CONFIG).streams)
+    print(format_header(), flush=True)
+    for stream_name in stream_names:
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+            result = executor.submit(
+                run_stream,
+                stream_name,
+                args.records,
+                args.latency,
+                args.value_length,
+                args.config,
+            ).result()
+        print(format_row(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""Offline stand-in for the Planfix REST API."""
+
+import json
+import time
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache, partial
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+import requests
+from requests.adapters import BaseAdapter
+
+from tap_planfix.client import PlanfixStream
+from tap_planfix.streams import ContactsStream, TasksStream
+from tap_planfix.tap import TapPlanfix
+
+KEYSET_FILTER_TYPE = 1
+DATETIME_FORMAT = "%Y-%m-%dT%H:%MZ"
+# Generated records are updated one per hour back from this moment.
+LATEST_UPDATE = datetime(2022, 3, 10, tzinfo=timezone.utc)
+
+CachedRecord = Tuple[dict, str, Dict[int, datetime]]
+# Fields Planfix returns whether they are requested or not.
+ALWAYS_RETURNED = ("id", "key")
+
+
+@lru_cache(maxsize=None)
+def _filter_date(date_value: str) -> date:
+    return datetime.strptime(date_value, "%d-%m-%Y").date()
+
+
+def _property_type(schema: dict) -> Optional[str]:
+    types = schema.get("type", [])
+    if isinstance(types, str):
+        return types
+    return next((t for t in types if t != "null"), None)
+
+
+def _sample_value(schema: dict, i: int, text: str) -> object:
+    """Return a value of record `i` matching a JSON schema."""
+    property_type = _property_type(schema)
+    if property_type == "integer":
+        return i
+    if property_type == "number":
+        return i * 1.5
+    if property_type == "boolean":
+        return i % 2 == 0
+    if property_type == "array":
+        return [_sample_value(schema.get("items", {}), i, text)]
+    if property_type == "object":
+        return {
+            name: _sample_value(item, i, text)
+            for name, item in schema.get("properties", {}).items()
+        }
+    return text
+
+
+class PlanfixRecords:
+    """Build records of a stream the way Planfix returns them.
+
+    Standard fields are filled according to the stream schema. Every custom
+    field id of `fields` becomes an entry of `customFieldData`, named like the
+    Planfix field behind a schema column: the date filter field carries the
+    replication key, the other ids take the remaining columns in order.
+    Date-time fields hold `{"date", "time", "datetime"}` objects, every third
+    other field a directory `{"id", "value"}` object, the rest plain values.
+    Text values are `value_length` characters long.
+    """
+
+    def __init__(self, stream: PlanfixStream, value_length: int = 16) -> None:
+        self.value_length = value_length
+        properties = stream.schema["properties"]
+        requested = stream.fields.split(",")
+        self.standard = [
+            (name, properties.get(name, {})) for name in requested if not name.isdigit()
+        ]
+        planfix_names = {
+            column: name for name, column in stream.fields_name_map.items()
+        }
+        replication_key = stream.replication_key
+        columns = [
+            column
+            for column in properties
+            if column not in requested and column != replication_key
+        ]
+        self.custom: List[Tuple[int, str, dict]] = []
+        for field in requested:
+            if not field.isdigit():
+                continue
+            if int(field) == stream.filter_field_id and replication_key:
+                column = replication_key
+            elif columns:
+                column = columns.pop(0)
+            else:
+                column = f"Field {field}"
+            planfix_name = planfix_names.get(column, column)
+            self.custom.append((int(field), planfix_name, properties.get(column, {})))
+
+    @property
+    def field_metadata(self) -> List[dict]:
+        """Return the custom fields as the Planfix custom field list has them."""
+        return [
+            {"id": field_id, "name": name, "type": 0}
+            for field_id, name, _ in self.custom
+        ]
+
+    def _text(self, name: str, i: int) -> str:
+        return f"{name} {i} ".ljust(self.value_length, "x")[: self.value_length]
+
+    def __call__(self, i: int) -> dict:
+        """Return record `i`."""
+        record = {
+            name: _sample_value(schema, i, self._text(name, i))
+            for name, schema in self.standard
+        }
+        updated_at = LATEST_UPDATE - timedelta(hours=i)
+        custom_field_data = []
+        for position, (field_id, name, schema) in enumerate(self.custom):
+            value: object
+            if schema.get("format") == "date-time":
+                value = {
+                    "date": updated_at.strftime("%d-%m-%Y"),
+                    "time": updated_at.strftime("%H:%M"),
+                    "datetime": updated_at.strftime(DATETIME_FORMAT),
+                }
+            elif position % 3 == 0:
+                value = {"id": i, "value": self._text(name, i)}
+            else:
+                value = _sample_value(schema, i, self._text(name, i))
+            custom_field_data.append(
+                {"field": {"id": field_id, "name": name}, "value": value}
+            )
+        record["customFieldData"] = custom_field_data
+        return record
+
+
+class FakePlanfixAdapter(BaseAdapter):
+    """Serve Planfix list endpoints from `total` generated records.
+
+    Records come from the `routes` entry for the request path, or from
+    `make_record`. Request filters on the primary key and on date fields are
+    honoured, `offset` and `pageSize` too. Records are sorted as `sorting`
+    asks, by a date-time custom field id or a standard field name, and hold
+    only the standard fields and custom fields listed in `fields`. Every
+    response takes `latency` seconds, and the request at offset `fail_at`
+    gets a `400` response. Custom field lists are served from `metadata`, by
+    request path.
+    """
+
+    def __init__(
+        self,
+        total: int,
+        make_record: Optional[Callable[[int], dict]] = None,
+        fail_at: Optional[int] = None,
+        latency: float = 0.0,
+        routes: Optional[Dict[str, Callable[[int], dict]]] = None,
+        metadata: Optional[Dict[str, List[dict]]] = None,
+    ) -> None:
+        super().__init__()
+        self.total = total
+        self.fail_at = fail_at
+        self.latency = latency
+        self.make_record = make_record or (lambda i: {"id": i, "name": f"record {i}"})
+        self.routes = routes or {}
+        self.metadata = metadata or {}
+        self.payloads: List[dict] = []
+        self._cache: Dict[tuple, List[CachedRecord]] = {}
+
+    @classmethod
+    def for_streams(
+        cls,
+        streams: Iterable[PlanfixStream],
+        total: int,
+        value_length: int = 16,
+        latency: float = 0.0,
+    ) -> "FakePlanfixAdapter":
+        """Return an adapter serving realistic records for every stream."""
+        routes = {
+            stream.path: PlanfixRecords(stream, value_length) for stream in streams
+        }
+        metadata = {
+            stream.field_metadata_path: routes[stream.path].field_metadata
+            for stream in streams
+            if stream.field_metadata_path
+        }
+        return cls(total, latency=latency, routes=routes, metadata=metadata)
+
+    def prepare(self) -> None:
+        """Generate all records now, so that the first response is not slower."""
+        for make_record in [self.make_record, *self.routes.values()]:
+            self._records(make_record)
+
+    def send(self, request, **kwargs):
+        """Return one page of records for a list request."""
+        if self.latency:
+            time.sleep(self.latency)
+        if request.method == "GET":
+            return self._metadata_response(request)
+        payload = json.loads(request.body)
+        self.payloads.append(payload)
+        offset, page_size = payload["offset"], payload["pageSize"]
+        path = next(
+            (path for path in self.routes if request.path_url.endswith(path)), None
+        )
+        records = self._records(
+            self.routes[path] if path else self.make_record,
+            payload.get("fields"),
+            payload.get("sorting"),
+        )
+        for request_filter in payload.get("filters", []):
+            records = [r for r in records if self.matches(r[0], r[2], request_filter)]
+        page = ",".join(r[1] for r in records[offset : offset + page_size])
+        if request.path_url.endswith("/contact/list"):
+            key = "contacts"
+        elif request.path_url.endswith("/task/list"):
+            key = "tasks"
+        else:
+            key = "dataTagEntries"
+        response = requests.Response()
+        response.status_code = 400 if payload["offset"] == self.fail_at else 200
+        response.request = request
+        response._content = f'{{"result": "success", "{key}": [{page}]}}'.encode()
+        return response
+
+    def _metadata_response(self, request) -> requests.Response:
+        path = next(
+            (path for path in self.metadata if request.path_url.endswith(path)), None
+        )
+        response = requests.Response()
+        response.request = request
+        if path is None:
+            response.status_code = 404
+            response._content = b'{"result": "fail"}'
+            return response
+        content = {"result": "success", "customfields": self.metadata[path]}
+        response.status_code = 200
+        response._content = json.dumps(content).encode()
+        return response
+
+    def _records(
+        self,
+        make_record: Callable[[int], dict],
+        fields: Optional[str] = None,
+        sorting: Optional[List[dict]] = None,
+    ) -> List[CachedRecord]:
+        """Return every record of a route in `sorting` order, generated once.
+
+        Each record comes with the JSON of its `fields` and the datetimes of its
+        date-time fields.
+        """
+        cache_key = (make_record, self.total, fields, json.dumps(sorting))
+        if cache_key in self._cache:
+            return self._cache[cache_key]
+        if fields is None and sorting is None:
+            records = [make_record(i) for i in range(self.total)]
+            cached = [
+                (record, json.dumps(record), self._field_datetimes(record))
+                for record in records
+            ]
+        else:
+            cached = [
+                (record, json.dumps(self._project(record, fields)), datetimes)
+                for record, _, datetimes in self._records(make_record)
+            ]
+            for order in reversed(sorting or []):
+                cached.sort(
+                    key=partial(self._sort_key, order["field"]),
+                    reverse=order.get("sortDirection") == "Desc",
+                )
+        self._cache[cache_key] = cached
+        return cached
+
+    @staticmethod
+    def _project(record: dict, fields: Optional[str]) -> dict:
+        if fields is None:
+            return record
+        requested = set(fields.split(",")) | set(ALWAYS_RETURNED)
+        projected = {name: value for name, value in record.items() if name in requested}
+        if "customFieldData" in record:
+            projected["customFieldData"] = [
+                field
+                for field in record["customFieldData"]
+                if str(field["field"]["id"]) in requested
+            ]
+        return projected
+
+    @staticmethod
+    def _sort_key(field: object, cached: CachedRecord) -> tuple:
+        record, _, datetimes = cached
+        value = datetimes.get(field) if isinstance(field, int) else record.get(field)
+        return (value is not None, value)
+
+    @staticmethod
+    def _field_datetimes(record: dict) -> Dict[int, datetime]:
+        return {
+            field["field"]["id"]: datetime.strptime(
+                field["value"]["datetime"], DATETIME_FORMAT
+            )
+            for field in record.get("customFieldData", [])
+            if isinstance(field["value"], dict) and "datetime" in field["value"]
+        }
+
+    @staticmethod
+    def matches(
+        record: dict, datetimes: Dict[int, datetime], request_filter: dict
+    ) -> bool:
+        """Return True if `record` passes a keyset or date request filter."""
+        if request_filter["type"] == KEYSET_FILTER_TYPE:
+            key = record.get("id", record.get("key"))
+            return key > request_filter["value"]
+        value = datetimes.get(request_filter.get("field"))  # type: ignore
+        if value is None:
+            return True
+        bound = _filter_date(request_filter["value"]["dateValue"])
+        if request_filter["operator"] == "gt":
+            return value.date() > bound
+        return value.date() < bound
+
+    def close(self):
+        """Release nothing, no connections are held."""
+
+
+SAMPLE_CONFIG = {
+    "planfix_url": "https://planfix.test/rest",
+    "planfix_token": "token",
+    "start_date": "2022-01-01",
+}
+
+
+def make_task(i: int) -> dict:
+    """Return task `i`, tasks being updated one per hour back from 2022-03-10."""
+    updated_at = LATEST_UPDATE - timedelta(hours=i)
+    return {
+        "id": i,
+        "customFieldData": [
+            {
+                "field": {"id": 48148, "name": "updated_at"},
+                "value": {"datetime": updated_at.strftime(DATETIME_FORMAT)},
+            }
+        ],
+    }
+
+
+def make_stream(
+    config: Optional[dict] = None,
+    total: int = 0,
+    stream_class: Type[PlanfixStream] = ContactsStream,
+    adapter: Optional[FakePlanfixAdapter] = None,
+    **kwargs,
+) -> Tuple[PlanfixStream, FakePlanfixAdapter]:
+    """Return a stream of a tap on `SAMPLE_CONFIG` and the adapter serving it.
+
+    Without `adapter`, the stream is served `total` records: tasks from
+    `make_task`, records of an id and a name for other streams.
+    """
+    tap = TapPlanfix(config={**SAMPLE_CONFIG, **(config or {})}, **kwargs)
+    stream = stream_class(tap=tap)
+    if adapter is None:
+        adapter = FakePlanfixAdapter(total, stream_class is TasksStream and make_task)
+    stream.requests_session.mount("https://", adapter)
+    return stream, adapter
@@ -0,0 +1,45 @@
+"""Tests for the offline Planfix stand-in and the benchmark on top of it."""
+
+from tap_planfix.streams import TasksStream
+from tap_planfix.tap import TapPlanfix
+from tap_planfix.tests.benchmark import format_header, format_row, run_stream
+from tap_planfix.tests.fake_planfix import (
+    SAMPLE_CONFIG,
+    FakePlanfixAdapter,
+    PlanfixRecords,
+)
+
+
+def test_generated_tasks_fill_their_columns():
+    stream = TasksStream(tap=TapPlanfix(config=SAMPLE_CONFIG))
+    task = PlanfixRecords(stream, value_length=20)(7)
+    row = stream.post_process(task)
+    assert row["updated_at"] == "2022-03-09T17:00:00+00:00"
+    assert len(row["Country"]) == 20
+    assert set(row) <= set(stream.schema["properties"])
+
+
+def test_stand_in_honours_fields_and_sorting():
+    stream = TasksStream(tap=TapPlanfix(config=SAMPLE_CONFIG))
+    stream.requests_session.mount(
+        "https://", FakePlanfixAdapter.for_streams([stream], total=50)
+    )
+    payload = {
+        "offset": 0,
+        "pageSize": 5,
+        "fields": "id,48148",
+        "sorting": [{"field": 48148, "sortDirection": "Asc"}],
+    }
+    response = stream.requests_session.post(stream.url_base + stream.path, json=payload)
+    tasks = response.json()["tasks"]
+    assert [task["id"] for task in tasks] == [49, 48, 47, 46, 45]
+    assert all(set(task) == {"id", "customFieldData"} for task in tasks)
+    assert {f["field"]["id"] for t in tasks for f in t["customFieldData"]} == {48148}
+
+
+def test_benchmark_reports_throughput():
+    result = run_stream("planfix_contacts", records=250)
+    assert result["records"] == 250
+    assert result["requests_per_record"] == 4 / 250
+    assert result["records_per_second"] > 0 and result["peak_rss_mib"] > 0
+    assert len(format_row(result)) == len(format_header())
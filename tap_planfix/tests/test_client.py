@@ -0,0 +1,370 @@
+"""Tests for PlanfixStream request handling."""
+
+import json
+import time
+
+import pendulum
+import pytest
+import requests
+from singer_sdk.exceptions import FatalAPIError
+
+from tap_planfix.pagination import PagePipeline
+from tap_planfix.streams import TasksStream
+from tap_planfix.tap import TapPlanfix
+from tap_planfix.tests.fake_planfix import (
+    KEYSET_FILTER_TYPE,
+    SAMPLE_CONFIG,
+    FakePlanfixAdapter,
+    make_stream,
+    make_task,
+)
+
+
+def test_sequential_pagination():
+    stream, adapter = make_stream(total=250)
+    ids = [record["id"] for record in stream.get_records(None)]
+    assert ids == list(range(250))
+    assert [p["offset"] for p in adapter.payloads] == [0, 100, 200, 300]
+
+
+def test_concurrent_pagination_keeps_offset_order():
+    stream, adapter = make_stream({"page_concurrency": 4}, total=1050)
+    ids = [record["id"] for record in stream.get_records(None)]
+    assert ids == list(range(1050))
+    assert max(p["offset"] for p in adapter.payloads) < 1100 + 4 * 100
+
+
+def test_parallel_streams_write_whole_lines(capsys):
+    tap = TapPlanfix(config={**SAMPLE_CONFIG, "stream_concurrency": 3})
+    for stream in tap.streams.values():
+        stream.requests_session.mount("https://", FakePlanfixAdapter(0))
+    tap.sync_all()
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    schemas = {m["stream"] for m in messages if m["type"] == "SCHEMA"}
+    assert schemas == set(tap.streams)
+    assert set(messages[-1]["value"]["bookmarks"]) == set(tap.streams)
+
+
+def test_adaptive_page_size_keeps_offsets_contiguous():
+    stream, adapter = make_stream(
+        {"adaptive_page_size": True, "max_page_size": 400}, total=1000
+    )
+    ids = [record["id"] for record in stream.get_records(None)]
+    assert ids == list(range(1000))
+    assert [p["pageSize"] for p in adapter.payloads][:3] == [100, 200, 400]
+    offsets = [p["offset"] for p in adapter.payloads]
+    sizes = [p["pageSize"] for p in adapter.payloads]
+    assert all(o + s == n for o, s, n in zip(offsets, sizes, offsets[1:]))
+
+
+class OversizedPageAdapter(FakePlanfixAdapter):
+    """Time out on pages larger than `max_page_size`."""
+
+    max_page_size = 50
+
+    def send(self, request, **kwargs):
+        payload = json.loads(request.body)
+        if payload["pageSize"] > self.max_page_size:
+            self.payloads.append(payload)
+            raise requests.exceptions.ReadTimeout("Page too large")
+        return super().send(request, **kwargs)
+
+
+@pytest.mark.parametrize("page_concurrency", [1, 3])
+def test_oversized_page_is_retried_smaller(monkeypatch, page_concurrency):
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    config = {"adaptive_page_size": True, "page_concurrency": page_concurrency}
+    stream, adapter = make_stream(config, adapter=OversizedPageAdapter(230))
+    ids = [record["id"] for record in stream.get_records(None)]
+    assert ids == list(range(230))
+    first_page = [p["pageSize"] for p in adapter.payloads if p["offset"] == 0]
+    assert first_page == [100, 50]
+
+
+def read_messages(capsys, message_type="RECORD"):
+    lines = capsys.readouterr().out.splitlines()
+    messages = [json.loads(line) for line in lines]
+    return [m for m in messages if m["type"] == message_type]
+
+
+def test_precise_incremental_stops_at_bookmark(capsys):
+    bookmark = {
+        "replication_key": "updated_at",
+        "replication_key_value": "2022-03-09T12:00Z",
+    }
+    state = {"bookmarks": {"planfix_tasks": bookmark}}
+    stream, adapter = make_stream(
+        {"precise_incremental": True}, total=1000, stream_class=TasksStream, state=state
+    )
+    stream.sync()
+    ids = [m["record"]["id"] for m in read_messages(capsys)]
+    assert ids == list(range(12))
+    assert len(adapter.payloads) == 1
+    assert adapter.payloads[0]["filters"][0]["value"]["dateValue"] == "08-03-2022"
+
+
+def test_precise_incremental_with_keyset_pagination_only_filters(capsys):
+    bookmark = {
+        "replication_key": "updated_at",
+        "replication_key_value": "2022-03-01T12:00Z",
+    }
+    state = {"bookmarks": {"planfix_tasks": bookmark}}
+    config = {
+        "precise_incremental": True,
+        "keyset_filter_types": {"planfix_tasks": KEYSET_FILTER_TYPE},
+    }
+    stream, adapter = make_stream(
+        config, total=1000, stream_class=TasksStream, state=state
+    )
+    # Ascending keys are the oldest tasks first.
+    adapter.make_record = lambda i: {**make_task(999 - i), "id": i}
+    stream.sync()
+    ids = [m["record"]["id"] for m in read_messages(capsys)]
+    assert ids == list(range(796, 1000))
+    assert adapter.payloads[0]["sorting"] == [{"field": "id", "sortDirection": "Asc"}]
+
+
+def test_date_windows_are_fetched_concurrently_with_own_bookmarks(capsys, caplog):
+    config = {
+        "start_date": "2022-03-01",
+        "partition_window_days": 3,
+        "partition_concurrency": 3,
+    }
+    pendulum.set_test_now(pendulum.datetime(2022, 3, 10, 12))
+    try:
+        stream, adapter = make_stream(config, total=216, stream_class=TasksStream)
+        stream.sync()
+    finally:
+        pendulum.set_test_now()
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    ids = [m["record"]["id"] for m in messages if m["type"] == "RECORD"]
+    assert sorted(ids) == list(range(216))
+    assert ids[0] == 145 and ids[-1] == 0  # Oldest window first.
+    assert "not found in catalog schema" not in caplog.text
+
+    windows = {
+        tuple(f["value"]["dateValue"] for f in p["filters"]) for p in adapter.payloads
+    }
+    assert windows == {
+        ("28-02-2022", "04-03-2022"),
+        ("03-03-2022", "07-03-2022"),
+        ("06-03-2022", "10-03-2022"),
+        ("09-03-2022",),
+    }
+    partitions = messages[-1]["value"]["bookmarks"]["planfix_tasks"]["partitions"]
+    assert [p["context"]["window_end"] for p in partitions] == [
+        "2022-03-04T00:00:00+00:00",
+        "2022-03-07T00:00:00+00:00",
+        "2022-03-10T00:00:00+00:00",
+        None,
+    ]
+    assert [p["replication_key_value"] for p in partitions] == [
+        "2022-03-03T23:00:00+00:00",
+        "2022-03-06T23:00:00+00:00",
+        "2022-03-09T23:00:00+00:00",
+        "2022-03-10T00:00:00+00:00",
+    ]
+    assert [p.get("window_complete") for p in partitions] == [True, True, True, None]
+
+
+def test_completed_date_windows_are_skipped_and_the_open_one_closes(capsys):
+    config = {"start_date": "2022-03-02", "partition_window_days": 3}
+
+    def sync_at(now, state):
+        pendulum.set_test_now(now)
+        try:
+            stream, adapter = make_stream(
+                config, total=216, stream_class=TasksStream, state=state
+            )
+            stream.sync()
+        finally:
+            pendulum.set_test_now()
+        messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        windows = {
+            tuple(f["value"]["dateValue"] for f in p["filters"])
+            for p in adapter.payloads
+        }
+        return windows, messages[-1]["value"]
+
+    _, state = sync_at(pendulum.datetime(2022, 3, 10, 12), {})
+    windows, state = sync_at(pendulum.datetime(2022, 3, 10, 18), state)
+    assert windows == {("09-03-2022",)}
+
+    windows, state = sync_at(pendulum.datetime(2022, 3, 11, 12), state)
+    # The closed window goes on from the bookmark of the open one it was.
+    assert windows == {("09-03-2022", "11-03-2022"), ("10-03-2022",)}
+    partitions = state["bookmarks"]["planfix_tasks"]["partitions"]
+    assert [p["context"]["window_end"] for p in partitions] == [
+        "2022-03-05T00:00:00+00:00",
+        "2022-03-08T00:00:00+00:00",
+        "2022-03-11T00:00:00+00:00",
+        None,
+    ]
+    assert partitions[2]["replication_key_value"] == "2022-03-10T00:00:00+00:00"
+
+
+def test_page_checkpoints_resume_without_duplicates(capsys):
+    config = {"page_checkpoints": True, "adaptive_page_size": True}
+    stream, adapter = make_stream(config, total=1000)
+    adapter.fail_at = 700
+    with pytest.raises(FatalAPIError):
+        stream.sync()
+    output = capsys.readouterr().out
+    emitted = [json.loads(line) for line in output.splitlines()]
+    first_run = [m["record"]["id"] for m in emitted if m["type"] == "RECORD"]
+    state = [m for m in emitted if m["type"] == "STATE"][-1]["value"]
+    assert state["bookmarks"]["planfix_contacts"]["checkpoint"]["offset"] == 700
+
+    stream, adapter = make_stream(config, total=1000, state=state)
+    stream.sync()
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    second_run = [m["record"]["id"] for m in messages if m["type"] == "RECORD"]
+    assert first_run + second_run == list(range(1000))
+    assert "checkpoint" not in messages[-1]["value"]["bookmarks"]["planfix_contacts"]
+
+
+def test_pipelined_sync_transforms_records_and_resumes(capsys):
+    config = {"pipelined_sync": True, "page_checkpoints": True}
+    stream, adapter = make_stream(config, total=1000, stream_class=TasksStream)
+    adapter.fail_at = 500
+    with pytest.raises(FatalAPIError):
+        stream.sync()
+    emitted = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    first_run = [m["record"] for m in emitted if m["type"] == "RECORD"]
+    state = [m for m in emitted if m["type"] == "STATE"][-1]["value"]
+    assert state["bookmarks"]["planfix_tasks"]["checkpoint"]["offset"] == 500
+    assert first_run[0]["updated_at"] == "2022-03-10T00:00:00+00:00"
+
+    stream, adapter = make_stream(
+        config, total=1000, stream_class=TasksStream, state=state
+    )
+    stream.sync()
+    second_run = [m["record"]["id"] for m in read_messages(capsys)]
+    assert [r["id"] for r in first_run] + second_run == list(range(1000))
+
+
+def test_page_pipeline_bounds_pages_ahead_of_a_slow_consumer():
+    fetched = []
+
+    def pages():
+        for page in range(100):
+            fetched.append(page)
+            yield page, [{"id": page}]
+
+    pipeline = iter(PagePipeline(pages(), lambda r: {**r, "seen": True}, buffer=2))
+    assert next(pipeline) == (0, [{"id": 0, "seen": True}])
+    time.sleep(0.2)
+    # The page consumed, one page per queue, and one held by each stage.
+    assert len(fetched) <= 1 + 2 * 2 + 2
+    pipeline.close()
+    assert len(fetched) < 100
+
+
+def test_change_detection_emits_changed_records_and_tombstones(capsys, tmp_path):
+    config = {
+        "change_detection_db": str(tmp_path / "fingerprints.db"),
+        "emit_tombstones": True,
+    }
+    stream, adapter = make_stream(config, total=5)
+    adapter.make_record = lambda i: {"id": i, "name": str(i)}
+    stream.sync()
+    assert len(read_messages(capsys)) == 5
+
+    stream, adapter = make_stream(config, total=4)
+    adapter.make_record = lambda i: {"id": i, "name": "new" if i == 2 else str(i)}
+    stream.sync()
+    records = [m["record"] for m in read_messages(capsys)]
+    assert records[0] == {"id": 2, "name": "new"}
+    assert records[1]["id"] == 4 and records[1]["_sdc_deleted_at"]
+    assert len(records) == 2
+
+
+def test_change_detection_commits_after_output_is_written(capsys, tmp_path):
+    config = {
+        "change_detection_db": str(tmp_path / "fingerprints.db"),
+        "fast_output": True,
+    }
+    stream, adapter = make_stream(config, total=5)
+
+    def fail_flush():
+        raise OSError("stdout closed")
+
+    stream.writer.flush = fail_flush
+    with pytest.raises(OSError):
+        stream.sync()
+    stream.fingerprints.close()
+    capsys.readouterr()
+
+    stream, adapter = make_stream(config, total=5)
+    stream.sync()
+    assert len(read_messages(capsys)) == 5
+
+
+def test_keyset_pagination_resumes_after_last_key(capsys):
+    config = {
+        "keyset_filter_types": {"planfix_contacts": KEYSET_FILTER_TYPE},
+        "page_checkpoints": True,
+        "page_concurrency": 4,
+    }
+    stream, adapter = make_stream(config, total=250)
+    stream.sync()
+    ids = [m["record"]["id"] for m in read_messages(capsys)]
+    assert ids == list(range(250))
+    assert [p["offset"] for p in adapter.payloads] == [0, 0, 0, 0]
+    after_keys = [p["filters"][0]["value"] for p in adapter.payloads[1:]]
+    assert after_keys == [99, 199, 249]
+
+
+def test_deselected_custom_fields_are_not_requested():
+    catalog = TapPlanfix(config=SAMPLE_CONFIG).catalog_dict
+    for entry in catalog["streams"]:
+        for metadata in entry["metadata"]:
+            if metadata["breadcrumb"][-1:] in (["Country"], ["Promocode"]):
+                metadata["metadata"]["selected"] = False
+    stream, adapter = make_stream(stream_class=TasksStream, total=150, catalog=catalog)
+    stream.apply_catalog(stream._tap.input_catalog)
+
+    def make_record(i):
+        task = make_task(i)
+        task["customFieldData"] += [
+            {"field": {"id": 47184, "name": "Страна"}, "value": "NL"},
+            {"field": {"id": 47234, "name": "Промокод"}, "value": None},
+            {"field": {"id": 47390, "name": "Budget"}, "value": {"value": 10}},
+        ]
+        return task
+
+    adapter.make_record = make_record
+    records = list(stream.get_records(None))
+    assert "Country" not in records[0] and records[0]["Budget"] == 10
+    first, second = [p["fields"].split(",") for p in adapter.payloads[:2]]
+    assert "47184" in first and "47234" in first
+    assert "47184" not in second and "47234" not in second
+    assert "47390" in second and "48148" in second and "47680" in second
+
+
+def test_requests_wait_for_rate_limit_before_taking_a_slot():
+    config = {"requests_per_second": 1000, "max_requests_in_flight": 1}
+    stream, adapter = make_stream(config, total=250)
+    scheduler, slots = stream.request_scheduler, stream.request_slots
+    acquire = scheduler.acquire
+    free_slots = []
+
+    def acquire_and_check(priority=False):
+        free_slots.append(slots._value)
+        acquire(priority)
+
+    scheduler.acquire = acquire_and_check
+    assert len(list(stream.get_records(None))) == 250
+    assert free_slots == [1, 1, 1, 1]
+
+
+def test_streams_share_one_pooled_session():
+    tap = TapPlanfix(config={**SAMPLE_CONFIG, "page_concurrency": 8})
+    contacts, tasks = tap.streams["planfix_contacts"], tap.streams["planfix_tasks"]
+    assert contacts.requests_session is tasks.requests_session
+    assert contacts.authenticator is contacts.authenticator
+    adapter = contacts.requests_session.get_adapter("https://planfix.test")
+    assert adapter._pool_maxsize == 10
+    request = contacts.prepare_request(None, {"offset": 0, "page_size": 100})
+    assert "gzip" in request.headers["Accept-Encoding"]
+    assert request.headers["Authorization"] == "Bearer token"
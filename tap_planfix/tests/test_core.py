@@ -1,20 +1,33 @@
 """Tests standard tap features using the built-in SDK tests library."""
 
-import datetime
-
+import pytest
 from singer_sdk.testing import get_standard_tap_tests
 
+import tap_planfix.tap
 from tap_planfix.tap import TapPlanfix
+from tap_planfix.tests.fake_planfix import SAMPLE_CONFIG, FakePlanfixAdapter
+from tap_planfix.transport import PlanfixTransport
+
+
+@pytest.fixture
+def offline_planfix(monkeypatch):
+    """Serve every stream of the tap from the offline Planfix stand-in."""
+    streams = TapPlanfix(config=SAMPLE_CONFIG).streams.values()
+    adapter = FakePlanfixAdapter.for_streams(streams, total=250)
 
-SAMPLE_CONFIG = {}
+    class OfflineTransport(PlanfixTransport):
+        def __init__(self, pool_size: int) -> None:
+            super().__init__(pool_size)
+            self.session.mount("https://", adapter)
+
+    monkeypatch.setattr(tap_planfix.tap, "PlanfixTransport", OfflineTransport)
+    return adapter
 
 
 # Run standard built-in tap tests from the SDK:
-def test_standard_tap_tests():
+def test_standard_tap_tests(offline_planfix):
     """Run standard tap tests from the SDK."""
     tests = get_standard_tap_tests(TapPlanfix, config=SAMPLE_CONFIG)
     for test in tests:
         test()
-
-
-# TODO: Create additional tests as appropriate for your tap.
+    assert offline_planfix.payloads
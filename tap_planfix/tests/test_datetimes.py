@@ -0,0 +1,31 @@
+"""Tests for Planfix datetime parsing and normalization."""
+
+from datetime import datetime, timezone
+
+from tap_planfix.datetimes import normalize_datetime, parse_datetime
+
+
+def test_normalize_planfix_formats():
+    assert normalize_datetime("2022-03-01T10:00Z") == "2022-03-01T10:00:00+00:00"
+    assert normalize_datetime("2022-03-01T10:00:05Z") == "2022-03-01T10:00:05+00:00"
+    assert normalize_datetime("01-03-2022") == "2022-03-01T00:00:00+00:00"
+    assert normalize_datetime("01-03-2022 10:30") == "2022-03-01T10:30:00+00:00"
+    assert normalize_datetime("01-03-2022 10:30:15") == "2022-03-01T10:30:15+00:00"
+    assert normalize_datetime("2022-03-01T10:00:00+03:00") == (
+        "2022-03-01T10:00:00+03:00"
+    )
+
+
+def test_normalize_leaves_other_values_unchanged():
+    assert normalize_datetime("not a date") == "not a date"
+    assert normalize_datetime("31-02-2022") == "31-02-2022"
+    assert normalize_datetime(None) is None
+    assert normalize_datetime({"id": 1}) == {"id": 1}
+
+
+def test_parse_datetime_is_aware():
+    assert parse_datetime("2022-03-01T10:00Z") == datetime(
+        2022, 3, 1, 10, tzinfo=timezone.utc
+    )
+    assert parse_datetime(datetime(2022, 3, 1)).tzinfo == timezone.utc
+    assert parse_datetime("") is None
@@ -0,0 +1,101 @@
+"""Tests for the custom field metadata cache."""
+
+import json
+
+from tap_planfix.fieldcache import FieldCache, metadata_hash, resolve_field_columns
+from tap_planfix.streams import CompletedRequestsStream
+from tap_planfix.tap import TapPlanfix
+from tap_planfix.tests.fake_planfix import (
+    SAMPLE_CONFIG,
+    FakePlanfixAdapter,
+    make_stream,
+)
+
+
+class MetadataCountingAdapter(FakePlanfixAdapter):
+    """Count the custom field list requests."""
+
+    metadata_requests = 0
+
+    def _metadata_response(self, request):
+        self.metadata_requests += 1
+        return super()._metadata_response(request)
+
+
+def make_adapter():
+    stream = CompletedRequestsStream(tap=TapPlanfix(config=SAMPLE_CONFIG))
+    return MetadataCountingAdapter.for_streams([stream], total=50)
+
+
+def test_resolve_field_columns_keeps_columns_of_renamed_fields():
+    fields = [
+        {"id": 1, "name": "Оценка"},
+        {"id": 2, "name": "Оценка клиента"},
+        {"id": 3, "name": "Unknown"},
+    ]
+    columns, renamed = resolve_field_columns(
+        fields, {"Оценка": "Score"}, ["Score", "Priority"], known={2: "Priority"}
+    )
+    assert columns == {1: "Score", 2: "Priority"}
+    assert renamed == [2]
+    assert metadata_hash(fields) == metadata_hash(reversed(fields))
+
+
+def test_field_columns_are_cached_across_runs(tmp_path):
+    cache_path = tmp_path / "fields.json"
+    config = {"field_cache_path": str(cache_path)}
+    stream, adapter = make_stream(
+        config, stream_class=CompletedRequestsStream, adapter=make_adapter()
+    )
+    records = list(stream.get_records(None))
+    assert adapter.metadata_requests == 1
+    entry = json.loads(cache_path.read_text())["planfix_completed_request"]
+    assert entry["columns"]["30098"] == "Finished_at_datetime"
+
+    stream, adapter = make_stream(
+        config, stream_class=CompletedRequestsStream, adapter=adapter
+    )
+    assert list(stream.get_records(None)) == records
+    assert adapter.metadata_requests == 1
+
+
+def test_renamed_field_keeps_its_column(tmp_path):
+    cache_path = tmp_path / "fields.json"
+    config = {"field_cache_path": str(cache_path)}
+    stream, adapter = make_stream(
+        config, stream_class=CompletedRequestsStream, adapter=make_adapter()
+    )
+    column = stream.discovered_field_columns()[30106]
+    for field in adapter.metadata["/customfield/datatag/7064"]:
+        if field["id"] == 30106:
+            field["name"] = "Renamed field"
+
+    stream, adapter = make_stream(
+        {**config, "field_cache_ttl": 1e-9},
+        stream_class=CompletedRequestsStream,
+        adapter=adapter,
+    )
+    row = {
+        "key": 1,
+        "customFieldData": [
+            {"field": {"id": 30106, "name": "Renamed field"}, "value": "5"}
+        ],
+    }
+    assert stream.post_process(row)[column] == "5"
+    assert adapter.metadata_requests == 2
+    entry = FieldCache(str(cache_path), ttl=60).get("planfix_completed_request")
+    assert entry["columns"]["30106"] == column
+
+
+def test_field_metadata_request_leaves_page_size_alone(tmp_path):
+    config = {
+        "field_cache_path": str(tmp_path / "fields.json"),
+        "adaptive_page_size": True,
+        "max_page_size": 400,
+    }
+    stream, adapter = make_stream(
+        config, stream_class=CompletedRequestsStream, adapter=make_adapter()
+    )
+    assert stream.discovered_field_columns()
+    assert adapter.metadata_requests == 1
+    assert stream.page_size == 100
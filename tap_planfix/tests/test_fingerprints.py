@@ -0,0 +1,32 @@
+"""Tests for the record fingerprint store."""
+
+from tap_planfix.fingerprints import FingerprintStore
+
+
+def test_streams_commit_only_their_own_changes(tmp_path):
+    path = str(tmp_path / "fingerprints.db")
+    store = FingerprintStore(path)
+    store.put("contacts", "[1]", b"a", "sync-1")
+    store.put("tasks", "[1]", b"b", "sync-2")
+    store.commit("contacts")
+
+    reopened = FingerprintStore(path)
+    assert reopened.get("contacts", "[1]") == b"a"
+    assert reopened.get("tasks", "[1]") is None
+    reopened.rollback("tasks")
+    reopened.commit("tasks")
+    assert reopened.get("tasks", "[1]") is None
+
+
+def test_staged_keys_are_not_missing_and_deletes_wait_for_commit(tmp_path):
+    store = FingerprintStore(str(tmp_path / "fingerprints.db"))
+    store.put("contacts", "[1]", b"a", "sync-1")
+    store.put("contacts", "[2]", b"b", "sync-1")
+    store.commit("contacts")
+
+    store.put("contacts", "[1]", b"a", "sync-2")
+    assert list(store.missing_keys("contacts", "sync-2")) == ["[2]"]
+    store.delete("contacts", "[2]", "sync-2")
+    assert store.get("contacts", "[2]") == b"b"
+    store.commit("contacts")
+    assert store.get("contacts", "[2]") is None
@@ -0,0 +1,71 @@
+"""Tests for per-stream performance metrics."""
+
+import json
+import logging
+
+from tap_planfix.metrics import MetricsRegistry
+from tap_planfix.tap import TapPlanfix
+from tap_planfix.tests.fake_planfix import (
+    SAMPLE_CONFIG,
+    FakePlanfixAdapter,
+    make_stream,
+)
+
+
+def test_latency_histogram_is_cumulative():
+    registry = MetricsRegistry()
+    metrics = registry.for_stream("planfix_tasks")
+    for seconds in (0.05, 0.3, 0.3, 120):
+        metrics.observe_request(seconds, 1000)
+    buckets = {
+        point["tags"]["le"]: point["value"]
+        for point in metrics.points()
+        if point["metric"] == "http_request_duration_bucket"
+    }
+    assert buckets["0.1"] == 1 and buckets["0.5"] == 3 and buckets["+Inf"] == 4
+    text = registry.prometheus_text()
+    assert "# TYPE planfix_http_request_duration_seconds histogram" in text
+    assert 'planfix_response_bytes_total{stream="planfix_tasks"} 4000' in text
+
+
+def test_sync_reports_metrics_and_profile(caplog, tmp_path):
+    config = {
+        "metrics_textfile": str(tmp_path / "planfix.prom"),
+        "profile_dir": str(tmp_path / "profiles"),
+    }
+    stream, adapter = make_stream(config, total=250)
+    with caplog.at_level(logging.INFO):
+        stream.sync()
+    points = [
+        json.loads(record.getMessage().split("METRIC: ", 1)[1])
+        for record in caplog.records
+        if 'METRIC: {"' in record.getMessage()
+    ]
+    values = {p["metric"]: p["value"] for p in points if "le" not in p["tags"]}
+    assert values["http_request_count"] == 4
+    assert values["page_count"] == 4
+    assert values["fetched_record_count"] == 250
+    assert values["parse_duration"] > 0 and values["post_process_duration"] > 0
+    assert not any("Request payload" in r.getMessage() for r in caplog.records)
+
+    textfile = (tmp_path / "planfix.prom").read_text()
+    assert 'planfix_page_total{stream="planfix_contacts"} 4' in textfile
+    assert (tmp_path / "profiles" / "planfix_contacts.prof").exists()
+
+
+def test_parallel_streams_share_the_textfile(tmp_path, capsys):
+    textfile = tmp_path / "planfix.prom"
+    config = {
+        **SAMPLE_CONFIG,
+        "stream_concurrency": 9,
+        "metrics_interval": 1e-9,
+        "metrics_textfile": str(textfile),
+    }
+    tap = TapPlanfix(config=config)
+    adapter = FakePlanfixAdapter.for_streams(tap.streams.values(), total=300)
+    tap.transport.session.mount("https://", adapter)
+    tap.sync_all()
+    pages = [
+        line for line in textfile.read_text().splitlines() if "page_total{" in line
+    ]
+    assert len(pages) == len(tap.streams)
@@ -0,0 +1,31 @@
+"""Tests for incremental response decoding."""
+
+import json
+
+import pytest
+
+from tap_planfix.parsing import iter_json_array
+
+
+def test_iter_json_array_matches_full_decode():
+    page = {
+        "result": "success",
+        "meta": {"tasks": ["not", "this"]},
+        "tasks": [{"id": 1, "customFieldData": [{"value": {"datetime": None}}]}, 2],
+        "total": 2,
+    }
+    document = json.dumps(page, indent=2, ensure_ascii=False)
+    assert list(iter_json_array(document, "tasks")) == page["tasks"]
+
+
+@pytest.mark.parametrize(
+    "document",
+    ["", "{}", '{"tasks": []}', '{"result": "success"}', '{"tasks": null}'],
+)
+def test_iter_json_array_empty_pages(document):
+    assert list(iter_json_array(document, "tasks")) == []
+
+
+def test_iter_json_array_rejects_broken_documents():
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array('{"tasks": [1 2]}', "tasks"))
@@ -0,0 +1,47 @@
+"""Tests for the shared request scheduler."""
+
+import threading
+import time
+
+from tap_planfix.ratelimit import RequestScheduler, parse_retry_after
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+
+
+def test_scheduler_enforces_rate_after_burst():
+    scheduler = RequestScheduler(rate=50, burst=5)
+    started = time.monotonic()
+    for _ in range(15):
+        scheduler.acquire()
+    assert time.monotonic() - started >= 10 / 50 * 0.9
+
+
+def test_scheduler_serves_priority_first():
+    scheduler = RequestScheduler(rate=20, burst=1)
+    scheduler.acquire()
+    order = []
+
+    def acquire(name, priority):
+        scheduler.acquire(priority=priority)
+        order.append(name)
+
+    backfill = threading.Thread(target=acquire, args=("backfill", False))
+    backfill.start()
+    time.sleep(0.01)
+    incremental = threading.Thread(target=acquire, args=("incremental", True))
+    incremental.start()
+    backfill.join()
+    incremental.join()
+    assert order == ["incremental", "backfill"]
+
+
+def test_scheduler_pauses_on_too_many_requests():
+    scheduler = RequestScheduler(rate=1000, burst=10)
+    scheduler.observe(429, {"Retry-After": "0.2"})
+    started = time.monotonic()
+    scheduler.acquire()
+    assert time.monotonic() - started >= 0.15
@@ -0,0 +1,130 @@
+"""Tests for datatag streams built from config."""
+
+import json
+import threading
+
+import pytest
+
+from tap_planfix.streams import CashInflowStream, DataTagStream
+from tap_planfix.tap import TapPlanfix
+from tap_planfix.tests.fake_planfix import SAMPLE_CONFIG, FakePlanfixAdapter
+
+REFUNDS = {
+    "name": "planfix_refunds",
+    "datatag_id": 7200,
+    "replication_key": "Refund_datetime",
+    "fields": [
+        {"id": 30500, "name": "Сумма", "column": "Sum", "type": "number"},
+        {
+            "id": 30502,
+            "name": "Дата возврата",
+            "column": "Refund_datetime",
+            "type": "date-time",
+        },
+        {"id": 30504, "column": "Reason"},
+    ],
+}
+
+
+def test_built_in_datatag_streams_keep_their_endpoint():
+    stream = CashInflowStream(tap=TapPlanfix(config=SAMPLE_CONFIG))
+    assert stream.path == "/datatag/7052/entry/list"
+    assert stream.primary_keys == ["key"]
+    assert stream.filter_field_type_id == 3101
+
+
+def test_datatag_stream_from_config():
+    tap = TapPlanfix(config={**SAMPLE_CONFIG, "datatags": [REFUNDS]})
+    stream = tap.streams["planfix_refunds"]
+    assert isinstance(stream, DataTagStream)
+    assert stream.path == "/datatag/7200/entry/list"
+    assert stream.fields == "dataTag,key,30500,30502,30504"
+    assert stream.fields_name_map == {
+        "Сумма": "Sum",
+        "Дата возврата": "Refund_datetime",
+    }
+    assert stream.field_ids == {
+        30500: "Sum",
+        30502: "Refund_datetime",
+        30504: "Reason",
+    }
+    assert stream.replication_key == "Refund_datetime"
+    assert stream.filter_field_id == 30502
+    properties = stream.schema["properties"]
+    assert properties["Refund_datetime"]["format"] == "date-time"
+    assert "number" in properties["Sum"]["type"]
+    assert "string" in properties["Reason"]["type"]
+
+
+def test_datatag_fields_without_name_are_mapped_by_id():
+    tap = TapPlanfix(config={**SAMPLE_CONFIG, "datatags": [REFUNDS]})
+    stream = tap.streams["planfix_refunds"]
+    row = {
+        "key": 1,
+        "customFieldData": [
+            {"field": {"id": 30504, "name": "Причина возврата"}, "value": "late"},
+            {"field": {"id": 30500, "name": "Сумма"}, "value": 10.5},
+        ],
+    }
+    assert stream.post_process(row) == {"key": 1, "Reason": "late", "Sum": 10.5}
+
+
+def test_datatag_config_errors():
+    with pytest.raises(ValueError, match="not a column"):
+        DataTagStream.from_config({**REFUNDS, "replication_key": "Missing"})
+    with pytest.raises(ValueError, match="Unknown type"):
+        DataTagStream.from_config(
+            {**REFUNDS, "fields": [{"id": 1, "column": "A", "type": "date"}]}
+        )
+    with pytest.raises(ValueError, match="Duplicate stream names"):
+        TapPlanfix(
+            config={
+                **SAMPLE_CONFIG,
+                "datatags": [{**REFUNDS, "name": "planfix_cash_in"}],
+            }
+        )
+
+
+class CountingAdapter(FakePlanfixAdapter):
+    """Record the largest number of requests served at once."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return super().send(request, **kwargs)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def test_configured_datatags_sync_concurrently_within_request_budget(capsys):
+    datatags = [
+        {**REFUNDS, "name": f"planfix_refunds_{n}", "datatag_id": 7200 + n}
+        for n in range(6)
+    ]
+    config = {
+        **SAMPLE_CONFIG,
+        "datatags": datatags,
+        "stream_concurrency": 6,
+        "max_requests_in_flight": 2,
+    }
+    tap = TapPlanfix(config=config)
+    adapter = CountingAdapter.for_streams(tap.streams.values(), total=150, latency=0.02)
+    tap.transport.session.mount("https://", adapter)
+    tap.sync_all()
+
+    names = {entry["name"] for entry in datatags}
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    records = [m for m in messages if m["type"] == "RECORD" and m["stream"] in names]
+    assert {m["stream"] for m in records} == names
+    # Records between 2022-01-01 and 2022-03-10 are one per hour.
+    assert len(records) == 6 * 150
+    assert adapter.max_in_flight == 2
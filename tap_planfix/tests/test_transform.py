@@ -0,0 +1,82 @@
+"""Tests for custom field flattening."""
+
+from tap_planfix.streams import CompletedRequestsStream
+from tap_planfix.transform import (
+    CustomFieldTransformer,
+    extract_any,
+    extract_datetime,
+    extract_value,
+)
+
+
+def make_transformer():
+    return CustomFieldTransformer(
+        CompletedRequestsStream.fields_name_map, CompletedRequestsStream.schema
+    )
+
+
+def custom_field(field_id, name, value):
+    return {"field": {"id": field_id, "name": name}, "value": value}
+
+
+def test_transform_maps_names_and_extracts_values():
+    row = {
+        "key": 1,
+        "customFieldData": [
+            custom_field(30094, "Исполнитель", {"id": 5, "value": "Ivan"}),
+            custom_field(
+                30098,
+                "Дата и время завершения",
+                {"date": "01-03-2022", "datetime": "2022-03-01T10:00Z"},
+            ),
+            custom_field(30106, "Оценка", "5"),
+            custom_field(1, "Not in schema", "dropped"),
+        ],
+    }
+    assert make_transformer().transform(row) == {
+        "key": 1,
+        "Executor": "Ivan",
+        "Finished_at_datetime": "2022-03-01T10:00:00+00:00",
+        "Score": "5",
+    }
+
+
+def test_transform_does_not_leak_values_between_rows():
+    transformer = make_transformer()
+    first = {
+        "key": 1,
+        "customFieldData": [custom_field(30106, "Оценка", "5")],
+    }
+    second = {
+        "key": 2,
+        "customFieldData": [custom_field(30094, "Исполнитель", None)],
+    }
+    transformer.transform(first)
+    assert transformer.transform(second) == {"key": 2, "Executor": None}
+
+
+def test_extractors_agree_with_extract_any():
+    values = [
+        {"date": "01-03-2022", "datetime": "2022-03-01T10:00Z"},
+        {"datetime": None, "value": "5"},
+        {"id": 5, "value": "Ivan"},
+        {"id": 5, "value": None},
+        {"id": 5},
+        "5",
+        None,
+        [1, 2],
+    ]
+    for extract in (extract_datetime, extract_value):
+        assert [extract(v) for v in values] == [extract_any(v) for v in values]
+
+
+def test_fields_first_seen_empty_are_compiled_again():
+    transformer = make_transformer()
+    empty = {"key": 1, "customFieldData": [custom_field(30094, "Исполнитель", None)]}
+    filled = {
+        "key": 2,
+        "customFieldData": [custom_field(30094, "Исполнитель", {"value": "Ivan"})],
+    }
+    transformer.transform(empty)
+    assert transformer.transform(filled)["Executor"] == "Ivan"
+    assert transformer._compiled[30094][1] is extract_value
@@ -0,0 +1,68 @@
+"""Tests for Singer message output."""
+
+import gzip
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import singer
+from singer import RecordMessage, SchemaMessage
+
+from tap_planfix.tests.fake_planfix import make_stream
+from tap_planfix.writer import FastMessageEncoder
+
+
+def test_fast_encoder_matches_singer_format():
+    encoder = FastMessageEncoder()
+    time_extracted = datetime(2022, 3, 10, 1, 2, 3, 45, tzinfo=timezone.utc)
+    messages = [
+        RecordMessage(
+            stream="planfix_tasks",
+            record={"id": 1, "name": 'Задача "1"', "Budget": 1.5, "tags": None},
+            time_extracted=time_extracted,
+        ),
+        RecordMessage(stream="planfix_tasks", record={"id": 2}, version=3),
+        RecordMessage(stream="planfix_tasks", record={"amount": Decimal("0.10")}),
+        SchemaMessage(stream="planfix_tasks", schema={}, key_properties=["id"]),
+    ]
+    for message in messages:
+        line = encoder.encode(message)
+        assert line.endswith(b"\n") and line.count(b"\n") == 1
+        expected = json.loads(singer.format_message(message))
+        assert json.loads(line) == expected
+    assert b"0.10" in encoder.encode(messages[2])
+
+
+def test_fast_output_writes_the_same_messages(capsys):
+    def read_output():
+        messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        for message in messages:
+            message.pop("time_extracted", None)
+        return messages
+
+    stream, _ = make_stream(total=250)
+    stream.sync()
+    expected = read_output()
+    stream, _ = make_stream({"fast_output": True}, total=250)
+    stream.sync()
+    assert read_output() == expected
+
+
+def test_batch_mode_announces_files_before_state(capsys, tmp_path):
+    config = {"batch_dir": str(tmp_path), "batch_max_records": 100}
+    stream, _ = make_stream(config, total=250)
+    stream.sync()
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    types = [m["type"] for m in messages]
+    assert "RECORD" not in types
+    assert types.index("BATCH") < types.index("STATE")
+    assert types[-1] == "STATE"
+
+    batches = [m for m in messages if m["type"] == "BATCH"]
+    assert [b["batch_size"] for b in batches] == [100, 100, 50]
+    assert all(b["format"] == "jsonl" and b["compression"] == "gzip" for b in batches)
+    ids = []
+    for batch in batches:
+        with gzip.open(batch["filepath"]) as batch_file:
+            ids += [json.loads(line)["id"] for line in batch_file]
+    assert ids == list(range(250))
@@ -0,0 +1,135 @@
+"""Flattening of Planfix custom fields into stream columns."""
+
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from tap_planfix.datetimes import normalize_datetime
+
+
+def extract_any(value: Any) -> Any:
+    """Return the datetime, the value or the raw custom field value, in that order."""
+    if isinstance(value, dict):
+        if value.get("datetime") is not None:
+            return value["datetime"]
+        if value.get("value") is not None:
+            return value["value"]
+    return value
+
+
+def extract_datetime(value: Any) -> Any:
+    """Return `value["datetime"]`, falling back to `extract_any` on other shapes."""
+    try:
+        datetime_value = value["datetime"]
+    except (KeyError, TypeError):
+        return extract_any(value)
+    if datetime_value is None:
+        return extract_any(value)
+    return datetime_value
+
+
+def extract_value(value: Any) -> Any:
+    """Return `value["value"]`, falling back to `extract_any` on other shapes."""
+    try:
+        inner = value["value"]
+    except (KeyError, TypeError):
+        return extract_any(value)
+    if inner is None or "datetime" in value:
+        return extract_any(value)
+    return inner
+
+
+def normalized(extract: Callable) -> Callable:
+    """Return `extract` with datetime strings normalized to ISO-8601."""
+
+    def extract_normalized(value: Any) -> Any:
+        return normalize_datetime(extract(value))
+
+    return extract_normalized
+
+
+class CustomFieldTransformer:
+    """Flatten `customFieldData` of a row into the output columns of a stream.
+
+    Each custom field is resolved once, on first sight of its id, to the output
+    column named by `fields_name_map` (or the Planfix field name) and to an
+    extractor picked from the shape of its value. Fields listed in `field_ids`
+    go to the column given there instead, whatever their name. Values of
+    `date-time` columns are normalized to ISO-8601 with timezone. Fields without
+    a column in the stream schema, or whose column is not in `selected`, are
+    dropped.
+    """
+
+    def __init__(
+        self,
+        fields_name_map: Dict[str, str],
+        schema: dict,
+        selected: Optional[Iterable[str]] = None,
+        field_ids: Optional[Dict[int, str]] = None,
+    ) -> None:
+        self.fields_name_map = fields_name_map
+        self.properties = schema["properties"]
+        self.selected = set(selected) if selected is not None else None
+        self.field_ids = field_ids or {}
+        self._compiled: Dict[Hashable, Tuple[Optional[str], Callable]] = {}
+
+    @property
+    def field_columns(self) -> Dict[Hashable, Optional[str]]:
+        """Return the output column of every custom field id known or seen so far.
+
+        The column is None for fields that are dropped.
+        """
+        # Copied first, as fields are compiled while other threads read this.
+        compiled = self._compiled.copy()
+        columns: Dict[Hashable, Optional[str]] = {
+            field_id: column if self._keeps(column) else None
+            for field_id, column in self.field_ids.items()
+        }
+        columns.update((field_id, entry[0]) for field_id, entry in compiled.items())
+        return columns
+
+    def _keeps(self, column: Optional[str]) -> bool:
+        return column in self.properties and (
+            self.selected is None or column in self.selected
+        )
+
+    def _compile(self, field: dict) -> Tuple[Optional[str], Callable]:
+        planfix_field = field.get("field") or {}
+        field_id = planfix_field.get("id")
+        column = self.field_ids.get(field_id) if field_id is not None else None
+        if column is None:
+            name = planfix_field.get("name", "")
+            column = self.fields_name_map.get(name, name)
+        if not self._keeps(column):
+            return None, extract_any
+        value = field.get("value")
+        if value is None:
+            return column, extract_any
+        if isinstance(value, dict) and "datetime" in value:
+            extract = extract_datetime
+        elif isinstance(value, dict):
+            extract = extract_value
+        else:
+            extract = extract_any
+        if self.properties[column].get("format") == "date-time":
+            return column, normalized(extract)
+        return column, extract
+
+    def transform(self, row: dict) -> dict:
+        """Return `row` with its custom fields flattened into columns."""
+        custom_fields = row.pop("customFieldData", None)
+        if not custom_fields:
+            return row
+        compiled = self._compiled
+        for field in custom_fields:
+            field_id = (field.get("field") or {}).get("id")
+            entry = compiled.get(field_id) if field_id is not None else None
+            if entry is None:
+                entry = self._compile(field)
+                # Fields first seen empty are compiled again on a later row.
+                if field_id is not None and (
+                    entry[0] is None or field.get("value") is not None
+                ):
+                    compiled[field_id] = entry
+            column, extract = entry
+            if column is not None:
+                row[column] = extract(field.get("value"))
+        return row
@@ -0,0 +1,20 @@
+"""HTTP transport shared by all Planfix streams of a tap run."""
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PlanfixTransport:
+    """A single pooled `requests.Session` for all streams.
+
+    Connections, and with them TLS sessions, are reused across streams. The pool
+    holds `pool_size` connections per host, so that every concurrent request of
+    the run can keep its connection alive. `requests` asks for compressed
+    responses by default and decodes them.
+    """
+
+    def __init__(self, pool_size: int) -> None:
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
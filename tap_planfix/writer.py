@@ -0,0 +1,152 @@
+"""Singer message writer shared by all Planfix streams of a tap run."""
+
+import copy
+import json
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import singer
+from singer import RecordMessage, StateMessage
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+
+def _dumps_json(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+dumps: Callable[[Any], bytes] = orjson.dumps if orjson else _dumps_json
+
+
+class FastMessageEncoder:
+    """Encode Singer messages to the same JSON as `singer.format_message`, faster.
+
+    Messages are encoded compactly with `orjson` when it is installed, and with
+    the standard library otherwise. RECORD messages are assembled from an
+    envelope prepared once per stream around the encoded record. Messages with
+    values the fast encoders reject, e.g. `Decimal`, fall back to
+    `singer.format_message`.
+    """
+
+    def __init__(self) -> None:
+        self._envelopes: Dict[str, bytes] = {}
+        self._second: Optional[Tuple[datetime, bytes]] = None
+
+    def _time_extracted(self, time_extracted: datetime) -> bytes:
+        as_utc = time_extracted.astimezone(timezone.utc)
+        second = as_utc.replace(microsecond=0)
+        if self._second is None or self._second[0] != second:
+            self._second = (second, singer.utils.strftime(second)[:-8].encode())
+        return self._second[1] + b".%06dZ" % as_utc.microsecond
+
+    def encode(self, message: singer.Message) -> bytes:
+        """Return `message` as one JSON line."""
+        try:
+            if isinstance(message, RecordMessage):
+                return self._encode_record(message)
+            return dumps(message.asdict()) + b"\n"
+        except TypeError:
+            return (singer.format_message(message) + "\n").encode()
+
+    def _encode_record(self, message: RecordMessage) -> bytes:
+        envelope = self._envelopes.get(message.stream)
+        if envelope is None:
+            envelope = b'{"type":"RECORD","stream":%s,"record":' % dumps(message.stream)
+            self._envelopes[message.stream] = envelope
+        parts = [envelope, dumps(message.record)]
+        if message.version is not None:
+            parts.append(b',"version":%s' % dumps(message.version))
+        if message.time_extracted:
+            parts += [
+                b',"time_extracted":"',
+                self._time_extracted(message.time_extracted),
+                b'"',
+            ]
+        parts.append(b"}\n")
+        return b"".join(parts)
+
+
+class MessageWriter:
+    """Write Singer messages from concurrently syncing streams to stdout.
+
+    Each message is serialized by the calling thread and written as a whole line
+    under a lock, so lines from different streams never interleave. STATE is
+    merged here: every stream hands in a snapshot of its own bookmark and the
+    writer emits the combined state of all streams.
+
+    With `fast` set, messages are encoded by `FastMessageEncoder` and written
+    in batches of about `buffer_bytes`, in the order they were handed in. Call
+    `flush` to write out what is buffered.
+    """
+
+    def __init__(
+        self,
+        state: Optional[dict] = None,
+        fast: bool = False,
+        buffer_bytes: int = 1 << 16,
+    ) -> None:
+        self.lock = threading.Lock()
+        self.state = copy.deepcopy(state or {})
+        self.encoder = FastMessageEncoder() if fast else None
+        self.buffer_bytes = buffer_bytes
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+
+    def write_message(self, message: singer.Message) -> None:
+        """Write one message to stdout."""
+        if self.encoder:
+            self._write_fast(self.encoder.encode(message))
+            return
+        line = singer.format_message(message) + "\n"
+        with self.lock:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+
+    def write_state(self, stream_name: str, stream_state: dict) -> None:
+        """Merge the bookmark of `stream_name` and write the full tap state."""
+        snapshot = copy.deepcopy(stream_state)
+        with self.lock:
+            self.state.setdefault("bookmarks", {})[stream_name] = snapshot
+            message = StateMessage(value=self.state)
+            if self.encoder:
+                self._buffer_line(self.encoder.encode(message))
+                return
+            line = singer.format_message(message) + "\n"
+            sys.stdout.write(line)
+            sys.stdout.flush()
+
+    def _write_fast(self, line: bytes) -> None:
+        with self.lock:
+            self._buffer_line(line)
+
+    def _buffer_line(self, line: bytes) -> None:
+        self._buffer.append(line)
+        self._buffered += len(line)
+        if self._buffered >= self.buffer_bytes:
+            self._flush()
+
+    def flush(self) -> None:
+        """Write all buffered messages to stdout."""
+        with self.lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        data = b"".join(self._buffer)
+        self._buffer.clear()
+        self._buffered = 0
+        stdout_buffer = getattr(sys.stdout, "buffer", None)
+        if stdout_buffer is None:
+            sys.stdout.write(data.decode())
+            sys.stdout.flush()
+            return
+        # Text written to stdout elsewhere must come out first.
+        sys.stdout.flush()
+        stdout_buffer.write(data)
+        stdout_buffer.flush()